@@ -0,0 +1,43 @@
+"""Message encode throughput: python -m benchmark.bench_codec
+
+Compares the json based parse_message path the core used to take with the
+byte level encode_message and the cached MessageTemplate frames.
+"""
+import timeit
+
+from modi2_network_nvs_reset.util.message_util import (HEALTH_REPLY_MESSAGE,
+                                                     RESET_MESSAGE,
+                                                     encode_message,
+                                                     parse_message)
+
+RESET_DATA = bytes(1)
+HEALTH_REPLY_DATA = int.to_bytes(0xFFF, byteorder="little", length=8)
+PROPERTY_DATA = (2, None, 91, None)
+
+
+def frames_per_second(func, number=20000, repeat=5):
+    return number / min(timeit.repeat(func, number=number, repeat=repeat))
+
+
+CASES = (
+    ("reset / parse_message", lambda: parse_message(0x04, 30, 0x123, RESET_DATA).encode("utf-8")),
+    ("reset / encode_message", lambda: encode_message(0x04, 30, 0x123, RESET_DATA)),
+    ("reset / template", lambda: RESET_MESSAGE.encode(0x123)),
+    ("health reply / parse_message", lambda: parse_message(0x28, 0x0, 0x123, HEALTH_REPLY_DATA).encode("utf-8")),
+    ("health reply / encode_message", lambda: encode_message(0x28, 0x0, 0x123, HEALTH_REPLY_DATA)),
+    ("health reply / template", lambda: HEALTH_REPLY_MESSAGE.encode(0x123)),
+    ("property / parse_message", lambda: parse_message(0x03, 0, 0x123, PROPERTY_DATA).encode("utf-8")),
+    ("property / encode_message", lambda: encode_message(0x03, 0, 0x123, PROPERTY_DATA)),
+)
+
+# The old path, measured for comparison only
+REFERENCE_CASES = {name for name, _ in CASES if name.endswith("/ parse_message")}
+
+
+def run():
+    return {name: frames_per_second(func) for name, func in CASES}
+
+
+if __name__ == "__main__":
+    for name, rate in run().items():
+        print(f"{name:32s} {rate:>14,.0f} frames/s")
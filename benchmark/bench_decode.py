@@ -0,0 +1,61 @@
+"""Inbound frame decode throughput: python -m benchmark.bench_decode
+
+The bus stream models a full chain of modules sending health messages
+with the occasional assign-id frame, split into frames by FrameBuffer.
+"""
+import json
+import time
+from base64 import b64decode
+
+from modi2_network_nvs_reset.util.frame_util import FrameBuffer
+from modi2_network_nvs_reset.util.message_util import (decode_frame,
+                                                     encode_message)
+
+
+def health_chain_stream(module_count=20, rounds=500):
+    frames = []
+    for _ in range(rounds):
+        for module_id in range(module_count):
+            frames.append(encode_message(0x00, module_id, 0xFFF, (0, 0, 0, 0, 35, 0, 0, 0)))
+        frames.append(encode_message(0x05, 0x123, 0xFFF, (0xBC, 0x9A, 0x78, 0x56, 0x00, 0x00, 0x00, 0x40)))
+    return b"".join(frames)
+
+
+def json_decode(frame):
+    message = json.loads(frame)
+    return (
+        message["c"], message["s"], message["d"],
+        b64decode(message["b"]), message["l"],
+    )
+
+
+def frames_per_second(decode, frames, repeat=5):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frame in frames:
+            decode(frame)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(frames) / best
+
+
+CASES = (
+    ("json.loads + b64decode", json_decode),
+    ("decode_frame", decode_frame),
+)
+
+# The old path, measured for comparison only
+REFERENCE_CASES = {"json.loads + b64decode"}
+
+
+def run(stream=None):
+    frame_buffer = FrameBuffer()
+    frame_buffer.feed(stream if stream is not None else health_chain_stream())
+    frames = frame_buffer.frames()
+    return {name: frames_per_second(decode, frames) for name, decode in CASES}
+
+
+if __name__ == "__main__":
+    for name, rate in run().items():
+        print(f"{name:24s} {rate:>14,.0f} frames/s")
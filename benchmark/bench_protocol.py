@@ -0,0 +1,78 @@
+"""Per-message module classification cost: python -m benchmark.bench_protocol
+
+The "if-chain" and "dict literal" cases reproduce the lookups the core and
+util/module_util did before the shared registry in util/protocol_util.
+"""
+import timeit
+
+from modi2_network_nvs_reset.util.protocol_util import uuid_to_module_type
+
+UUIDS = (0x000012345ABC, 0x20301234ABCD, 0x40301234ABCD, 0x40111234ABCD)
+
+
+def if_chain(uuid):
+    module_type_temp = (uuid >> 32) & 0xFFFF
+    if module_type_temp == 0x0000:
+        return "Network"
+    elif module_type_temp == 0x0010:
+        return "Battery"
+    elif module_type_temp == 0x2000:
+        return "Env"
+    elif module_type_temp == 0x2010:
+        return "Gyro"
+    elif module_type_temp == 0x2030:
+        return "Button"
+    elif module_type_temp == 0x2040:
+        return "Dial"
+    elif module_type_temp == 0x2070:
+        return "Joystick"
+    elif module_type_temp == 0x2080:
+        return "ToF"
+    elif module_type_temp == 0x4000:
+        return "Display"
+    elif module_type_temp == 0x4010:
+        return "MotorA"
+    elif module_type_temp == 0x4011:
+        return "MotorB"
+    elif module_type_temp == 0x4020:
+        return "Led"
+    elif module_type_temp == 0x4030:
+        return "Speaker"
+    return "none"
+
+
+def dict_literal(uuid):
+    type_indicator = int(hex(uuid).lstrip("0x"), 16) >> 32
+    return {
+        0x10: "battery", 0x2000: "env", 0x2010: "gyro", 0x2020: "mic",
+        0x2030: "button", 0x2040: "dial", 0x2050: "ultrasonic", 0x2060: "ir",
+        0x2070: "joystick", 0x2080: "tof", 0x4000: "display", 0x4010: "motor",
+        0x4011: "motor", 0x4020: "led", 0x4030: "speaker",
+    }.get(type_indicator)
+
+
+def lookups_per_second(func, number=20000, repeat=5):
+    def classify_all():
+        for uuid in UUIDS:
+            func(uuid)
+    best = min(timeit.repeat(classify_all, number=number, repeat=repeat))
+    return number * len(UUIDS) / best
+
+
+CASES = (
+    ("if-chain", if_chain),
+    ("dict literal", dict_literal),
+    ("registry", uuid_to_module_type),
+)
+
+# The old lookups, measured for comparison only
+REFERENCE_CASES = {"if-chain", "dict literal"}
+
+
+def run():
+    return {name: lookups_per_second(func) for name, func in CASES}
+
+
+if __name__ == "__main__":
+    for name, rate in run().items():
+        print(f"{name:16s} {rate:>14,.0f} lookups/s")
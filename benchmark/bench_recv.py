@@ -0,0 +1,104 @@
+"""SerTask receive throughput: python -m benchmark.bench_recv
+
+Feeds a backlog of queued packets through SerTask.recv, SerTask.recv_many
+and a copy of the old bytes-reslicing recv, one read_all chunk at a time.
+"""
+import time
+
+from modi2_network_nvs_reset.util.connection_util import SerTask
+from modi2_network_nvs_reset.util.message_util import encode_message
+
+
+class ChunkBus:
+    def __init__(self, stream, chunk_size):
+        self.chunks = [
+            stream[i : i + chunk_size] for i in range(0, len(stream), chunk_size)
+        ]
+        self.index = 0
+
+    def read_all(self):
+        if self.index >= len(self.chunks):
+            return b""
+        self.index += 1
+        return self.chunks[self.index - 1]
+
+
+class BytesRecv:
+    """The SerTask.recv algorithm before the frame buffer"""
+
+    def __init__(self, bus):
+        self._bus = bus
+        self.json_buffer = b""
+
+    def recv(self):
+        self.json_buffer += self._bus.read_all()
+        idx = self.json_buffer.find(b"{")
+        if idx < 0:
+            self.json_buffer = b""
+            return None
+        self.json_buffer = self.json_buffer[idx:]
+        idx = self.json_buffer.find(b"}")
+        if idx < 0:
+            return None
+        json_pkt = self.json_buffer[: idx + 1].decode("utf8")
+        self.json_buffer = self.json_buffer[idx + 1 :]
+        return json_pkt
+
+
+def packet_stream(packet_count=20000):
+    return b"".join(
+        encode_message(0x00, i % 64, 0xFFF, (0, 0, 0, 0, 35, 0, 0, 0))
+        for i in range(packet_count)
+    )
+
+
+def drain_one_by_one(task, chunk_count):
+    packets = 0
+    for _ in range(chunk_count):
+        while task.recv() is not None:
+            packets += 1
+    return packets
+
+
+def drain_many(task, chunk_count):
+    packets = 0
+    for _ in range(chunk_count):
+        packets += len(task.recv_many())
+    return packets
+
+
+def packets_per_second(make_task, drain, stream, chunk_size):
+    bus = ChunkBus(stream, chunk_size)
+    task = make_task(bus)
+    start = time.perf_counter()
+    packets = drain(task, len(bus.chunks))
+    return packets / (time.perf_counter() - start)
+
+
+def make_ser_task(bus):
+    task = SerTask()
+    task._bus = bus
+    return task
+
+
+CASES = (
+    ("bytes recv", BytesRecv, drain_one_by_one),
+    ("SerTask.recv", make_ser_task, drain_one_by_one),
+    ("SerTask.recv_many", make_ser_task, drain_many),
+)
+
+# The old recv, measured for comparison only
+REFERENCE_CASES = {"bytes recv"}
+
+
+def run(chunk_size=64 * 1024):
+    stream = packet_stream()
+    return {
+        name: packets_per_second(make_task, drain, stream, chunk_size)
+        for name, make_task, drain in CASES
+    }
+
+
+if __name__ == "__main__":
+    for name, rate in run().items():
+        print(f"{name:20s} {rate:>14,.0f} packets/s")
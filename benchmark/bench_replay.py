@@ -0,0 +1,73 @@
+"""Reader throughput on replayed traffic: python -m benchmark.bench_replay [CAPTURE]
+
+Plays a capture written with --capture (or a synthetic health chain when
+none is given) through Network_reset_manager.readThread and through
+SerTask.recv_many as fast as they read it, no device needed.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from benchmark.bench_decode import health_chain_stream
+from modi2_network_nvs_reset.core.network_reset import Network_reset_manager
+from modi2_network_nvs_reset.util.capture_util import IN, CaptureWriter
+from modi2_network_nvs_reset.util.connection_util import SerTask
+from modi2_network_nvs_reset.util.replay_util import ReplaySerial
+
+
+def write_synthetic_capture(path, chunk_size=4096):
+    stream = health_chain_stream()
+    with CaptureWriter(path) as capture:
+        port = capture.port_index("replay")
+        for i in range(0, len(stream), chunk_size):
+            capture.record(IN, port, stream[i : i + chunk_size])
+
+
+def manager_frames_per_second(path):
+    ser = ReplaySerial.from_capture(path)
+    manager = Network_reset_manager(port=ser.port, ser=ser)
+    manager.latency_model = None
+    # The detection prints would dominate the measurement
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        manager.start_reset_thread()
+        # A capture of a complete reset ends the reader before the replay does
+        while not ser.exhausted.wait(0.001) and not manager.done_event.is_set():
+            pass
+        elapsed = time.perf_counter() - start
+        manager.stop()
+        manager.join()
+    return manager.read_stats["frames"] / elapsed
+
+
+def ser_task_frames_per_second(path):
+    task = SerTask()
+    task._bus = ReplaySerial.from_capture(path)
+    frames = 0
+    start = time.perf_counter()
+    while not task._bus.exhausted.is_set():
+        frames += len(task.recv_many())
+    return frames / (time.perf_counter() - start)
+
+
+CASES = (
+    ("Network_reset_manager", manager_frames_per_second),
+    ("SerTask.recv_many", ser_task_frames_per_second),
+)
+
+
+def run(path=None):
+    if path is not None:
+        return {name: measure(path) for name, measure in CASES}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "synthetic.cap")
+        write_synthetic_capture(path)
+        return {name: measure(path) for name, measure in CASES}
+
+
+if __name__ == "__main__":
+    for name, rate in run(sys.argv[1] if len(sys.argv) > 1 else None).items():
+        print(f"{name:24s} {rate:>14,.0f} frames/s")
@@ -0,0 +1,99 @@
+"""End to end reset cost on simulated modules: python -m benchmark.bench_reset
+
+The modules are simulated on pseudo terminals by a child process, so the
+CPU time measured here is the reset tool's alone. Measures the latency of
+single resets from port open to completion, the CPU seconds one reset
+costs, and how many resets per second a fleet reset reaches with 1, 8,
+32 and 128 modules attached. Unix only.
+"""
+import contextlib
+import io
+import multiprocessing
+import time
+
+from modi2_network_nvs_reset.core.network_reset import (
+    Network_reset_fleet_manager, Network_reset_manager)
+from modi2_network_nvs_reset.util.latency_util import (get_latency_model,
+                                                     percentile)
+
+FLEET_SIZES = (1, 8, 32, 128)
+
+LOWER_IS_BETTER = {
+    "reset latency p50 ms",
+    "reset latency p99 ms",
+    "cpu seconds per reset",
+}
+
+
+def serve_simulated_modules(connection, count):
+    from modi2_network_nvs_reset.util.simulator_util import ModuleSimulator
+    # Modules answer at once so the measurement is the tool, not the firmware
+    with ModuleSimulator(reset_delay=0.0, seed=0) as simulator:
+        simulator.add_network_modules(count)
+        connection.send(simulator.ports())
+        # Serve until the parent closes its end
+        try:
+            connection.recv()
+        except EOFError:
+            pass
+
+
+@contextlib.contextmanager
+def simulated_modules(count):
+    parent_connection, child_connection = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=serve_simulated_modules, args=(child_connection, count), daemon=True
+    )
+    process.start()
+    try:
+        yield parent_connection.recv()
+    finally:
+        parent_connection.close()
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+
+
+def reset_latencies(port, count=30):
+    latencies = []
+    for _ in range(count):
+        manager = Network_reset_manager(port=port)
+        manager.start_reset_thread()
+        manager.wait(10)
+        manager.join()
+        if manager.result.is_complete:
+            latencies.append(manager.result.elapsed)
+    return latencies
+
+
+def fleet_reset(ports):
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    results = Network_reset_fleet_manager(ports=ports).start_reset_thread()
+    elapsed = time.perf_counter() - start
+    complete = sum(result.is_complete for result in results)
+    return complete, elapsed, time.process_time() - cpu_start
+
+
+def run(fleet_sizes=FLEET_SIZES):
+    # Keep benchmark samples out of the learned reset latencies
+    get_latency_model().path = None
+    metrics = {}
+    with simulated_modules(max(fleet_sizes)) as ports, \
+            contextlib.redirect_stdout(io.StringIO()):
+        latencies = reset_latencies(ports[0])
+        metrics["reset latency p50 ms"] = percentile(latencies, 0.5) * 1000
+        metrics["reset latency p99 ms"] = percentile(latencies, 0.99) * 1000
+        resets = cpu_time = 0
+        for size in fleet_sizes:
+            complete, elapsed, cpu = fleet_reset(ports[:size])
+            metrics[f"fleet {size} resets/s"] = complete / elapsed
+            resets += complete
+            cpu_time += cpu
+        metrics["cpu seconds per reset"] = cpu_time / resets
+    return metrics
+
+
+if __name__ == "__main__":
+    for name, value in run().items():
+        print(f"{name:24s} {value:>14,.4f}")
@@ -0,0 +1,125 @@
+"""Every benchmark with a regression check: python -m benchmark.suite
+
+    python -m benchmark.suite --output results.json
+    python -m benchmark.suite --save-baseline         # accept the current numbers
+    python -m benchmark.suite --tolerance 0.3 codec decode
+
+Metrics are named "<benchmark>/<case>". Each benchmark module lists the
+cases where lower is better in LOWER_IS_BETTER, every other case is a
+rate. Cases in REFERENCE_CASES time code the tool no longer runs, kept
+for comparison, they are recorded with "reference": true and left out of
+the regression check. The run fails with exit code 1 when any other
+metric is worse than the baseline by more than the tolerance. Baselines are machine specific,
+save one on the machine which runs the comparison.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import time
+
+BENCHMARKS = ("codec", "decode", "protocol", "recv", "replay", "reset")
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def run_benchmarks(names):
+    metrics = {}
+    for name in names:
+        module = importlib.import_module(f"benchmark.bench_{name}")
+        lower_is_better = getattr(module, "LOWER_IS_BETTER", set())
+        reference_cases = getattr(module, "REFERENCE_CASES", set())
+        print(f"running {name}...", file=sys.stderr)
+        for case, value in module.run().items():
+            metrics[f"{name}/{case}"] = {
+                "value": value,
+                "lower_is_better": case in lower_is_better,
+                "reference": case in reference_cases,
+            }
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "metrics": metrics,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Returns (name, baseline, value, change, is_regression) of every shared metric
+
+    change is the relative improvement, negative when the metric got worse.
+    Reference metrics are skipped.
+    """
+    rows = []
+    for name, metric in results["metrics"].items():
+        if metric.get("reference"):
+            continue
+        base = baseline["metrics"].get(name)
+        if base is None or not base["value"]:
+            continue
+        change = metric["value"] / base["value"] - 1
+        if metric["lower_is_better"]:
+            change = -change
+        rows.append((name, base["value"], metric["value"], change, change < -tolerance))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark.suite")
+    parser.add_argument(
+        "benchmarks", nargs="*", metavar="BENCHMARK", help=f"Benchmarks to run, any of {', '.join(BENCHMARKS)}"
+    )
+    parser.add_argument("--output", help="Write the results as json to this file")
+    parser.add_argument(
+        "--baseline", default=DEFAULT_BASELINE,
+        help="Results to compare against (default: benchmark/baseline.json)"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="Allowed relative slowdown before failing (default: 0.2)"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="Store the results as the new baseline instead of comparing"
+    )
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(args.benchmarks or BENCHMARKS)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=1)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        for name, metric in results["metrics"].items():
+            print(f"{name:48s} {metric['value']:>16,.4f}")
+        print(f"No baseline at {args.baseline}, run with --save-baseline to store one")
+        return 0
+
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    regressions = 0
+    for name, base, value, change, is_regression in compare(
+        results, baseline, args.tolerance
+    ):
+        regressions += is_regression
+        flag = "REGRESSION" if is_regression else ""
+        print(f"{name:48s} {base:>16,.4f} {value:>16,.4f} {change:>+8.1%} {flag}")
+    if regressions:
+        print(f"{regressions} metric(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""Headless entry point
+
+python -m modi2_network_nvs_reset reset [--all] [--port PORT] [--json] [--trace FILE] [--capture FILE]
+python -m modi2_network_nvs_reset station [--json] [--trace FILE] [--capture FILE]
+
+Both commands take --simulate COUNT to run against simulated network
+modules on pseudo terminals instead of attached hardware.
+
+Drives the reset core directly and never imports PyQt5.
+"""
+import argparse
+import contextlib
+import json
+import sys
+import time
+
+from modi2_network_nvs_reset.core.network_reset import (
+    Network_reset_fleet_manager, Network_reset_station,
+    list_network_module_ports)
+from modi2_network_nvs_reset.util.capture_util import CaptureWriter
+from modi2_network_nvs_reset.util.latency_util import get_latency_model
+from modi2_network_nvs_reset.util.trace_util import Tracer
+
+
+def print_message(kind, *args):
+    if args:
+        print(f"[{kind}] {args[0]}", file=sys.stderr)
+
+
+def save_trace(tracer, path):
+    tracer.save(path)
+    print(tracer.format_summary(), file=sys.stderr)
+    print(f"Trace saved to {path}", file=sys.stderr)
+
+
+def add_trace_arguments(parser):
+    parser.add_argument(
+        "--trace", metavar="FILE",
+        help="Save a Chrome trace of every reset phase and frame to FILE"
+    )
+    parser.add_argument(
+        "--capture", metavar="FILE",
+        help="Record every byte read and written on the ports to FILE"
+    )
+
+
+def add_simulate_argument(parser):
+    parser.add_argument(
+        "--simulate", type=int, metavar="COUNT",
+        help="Use COUNT simulated network modules instead of attached ones"
+    )
+
+
+def open_simulator(args):
+    if not args.simulate:
+        return contextlib.nullcontext()
+    # Pseudo terminals are Unix only, keep the import off other platforms
+    from modi2_network_nvs_reset.util.simulator_util import ModuleSimulator
+    # Keep simulated resets out of the learned reset latencies
+    get_latency_model().path = None
+    simulator = ModuleSimulator()
+    simulator.add_network_modules(args.simulate)
+    return simulator
+
+
+def open_capture(args):
+    if args.capture:
+        return CaptureWriter(args.capture)
+    return contextlib.nullcontext()
+
+
+def reset(args):
+    with open_simulator(args) as simulator:
+        return reset_ports(args, simulator)
+
+
+def reset_ports(args, simulator):
+    if simulator is not None:
+        ports = simulator.ports()
+    elif args.port:
+        ports = args.port
+    else:
+        ports = list_network_module_ports()
+        if not args.all:
+            ports = ports[:1]
+
+    if not ports:
+        if args.json:
+            print(json.dumps([]))
+        else:
+            print("Please connect MODI+ Network Module", file=sys.stderr)
+        return 1
+
+    tracer = Tracer() if args.trace else None
+    with open_capture(args) as capture:
+        fleet_manager = Network_reset_fleet_manager(
+            ports=ports, detect_timeout=args.timeout, tracer=tracer, capture=capture
+        )
+        fleet_manager.set_message_callback(print_message)
+        if args.json:
+            # Keep stdout clean for the json document
+            with contextlib.redirect_stdout(sys.stderr):
+                results = fleet_manager.start_reset_thread()
+            print(json.dumps([result.to_dict() for result in results]))
+        else:
+            results = fleet_manager.start_reset_thread()
+    if tracer is not None:
+        save_trace(tracer, args.trace)
+    return 0 if all(result.is_complete for result in results) else 1
+
+
+def station(args):
+    with open_simulator(args) as simulator:
+        return run_station(args, simulator)
+
+
+def run_station(args, simulator):
+    tracer = Tracer() if args.trace else None
+    capture = CaptureWriter(args.capture) if args.capture else None
+    station = Network_reset_station(
+        detect_timeout=args.timeout, tracer=tracer, capture=capture,
+        list_ports=simulator.ports if simulator is not None else None,
+    )
+    if args.json:
+        output = sys.stdout
+        station.add_result_callback(
+            lambda result: print(json.dumps(result.to_dict()), file=output, flush=True)
+        )
+        stdout = contextlib.redirect_stdout(sys.stderr)
+    else:
+        station.set_message_callback(print_message)
+        stdout = contextlib.nullcontext()
+
+    print("Station mode, press Ctrl+C to stop", file=sys.stderr)
+    with stdout:
+        station.start()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            station.stop()
+            if capture is not None:
+                capture.close()
+    print(json.dumps(station.stats()), file=sys.stderr)
+    if tracer is not None:
+        save_trace(tracer, args.trace)
+    return 0 if station.failure_count == 0 else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m modi2_network_nvs_reset")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reset_parser = subparsers.add_parser("reset", help="Reset the NVS of network modules")
+    reset_parser.add_argument(
+        "--all", action="store_true",
+        help="Reset every attached network module in parallel"
+    )
+    reset_parser.add_argument(
+        "--port", action="append",
+        help="Port of a network module, may be given more than once"
+    )
+    reset_parser.add_argument(
+        "--json", action="store_true",
+        help="Print the results as json on stdout"
+    )
+    reset_parser.add_argument(
+        "--timeout", type=float, default=10,
+        help="Seconds to wait for a module to announce itself"
+    )
+    add_trace_arguments(reset_parser)
+    add_simulate_argument(reset_parser)
+    reset_parser.set_defaults(func=reset)
+
+    station_parser = subparsers.add_parser(
+        "station", help="Reset every network module as it is plugged in"
+    )
+    station_parser.add_argument(
+        "--json", action="store_true",
+        help="Print one json result per module on stdout"
+    )
+    station_parser.add_argument(
+        "--timeout", type=float, default=10,
+        help="Seconds to wait for a module to announce itself"
+    )
+    add_trace_arguments(station_parser)
+    add_simulate_argument(station_parser)
+    station_parser.set_defaults(func=station)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
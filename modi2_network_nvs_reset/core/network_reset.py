@@ -1,38 +1,255 @@
+import heapq
+import itertools
 import json
+import selectors
+import socket
 import sys
 import threading as th
 import time
-from base64 import b64decode, b64encode
+from collections import deque
+from base64 import b64encode
 from io import open
 from os import path
 import threading
 import os
 
 import serial
-# import serial.tools.list_ports as stl
-import serial.tools.list_ports as sp
 
+from modi2_network_nvs_reset.util.capture_util import CaptureSerial
 from modi2_network_nvs_reset.util.connection_util import SerTask
-from modi2_network_nvs_reset.util.message_util import (decode_message,
-                                                     parse_message,
-                                                     unpack_data)
-from modi2_network_nvs_reset.util.module_util import (Module,
-                                                    get_module_type_from_uuid)
-from modi2_network_nvs_reset.util.module_util import (Module,
-                                                    get_module_uuid_from_type)
-
-def retry(exception_to_catch):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
+from modi2_network_nvs_reset.util.discovery_util import get_device_index
+from modi2_network_nvs_reset.util.dispatch_util import (Dispatcher,
+                                                      SourceRateLimiter)
+from modi2_network_nvs_reset.util.frame_util import FrameBuffer
+from modi2_network_nvs_reset.util.latency_util import get_latency_model
+from modi2_network_nvs_reset.util.message_util import (HEALTH_REPLY_MESSAGE,
+                                                     REQUEST_UUID_MESSAGE,
+                                                     RESET_MESSAGE,
+                                                     try_decode_frame)
+from modi2_network_nvs_reset.util.protocol_util import (ASSIGN_ID,
+                                                      BROADCAST_ID, ESP32_ID,
+                                                      HEALTH,
+                                                      LEGACY_MODULE_TYPE_CODES,
+                                                      LEGACY_MODULE_TYPES,
+                                                      VERSION, WARNING,
+                                                      get_type_code,
+                                                      version_to_string)
+from modi2_network_nvs_reset.util.request_util import RequestTracker
+from modi2_network_nvs_reset.util.retry_util import RetryPolicy
+
+def list_network_module_ports():
+    """Returns every port a MODI+ network module is attached to
+
+    :return: List[str]
+    """
+    return get_device_index().network_module_ports()
+
+
+class Serial_io_reactor:
+    """Serves the serial ports and reset deadlines of many managers from one thread
+
+    Port file descriptors are waited on with the platform selector (epoll on
+    Linux), so the thread only wakes when bytes arrive or the earliest timer
+    in the heap is due. Every method may be called from any thread; changes
+    are queued and applied on the reactor thread.
+    """
+
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.timers = []
+        self.running = False
+        self.thread = None
+        self.__sequence = itertools.count()
+        self.__pending = deque()
+        self.__ports = dict()
+        self.__wakeup_reader, self.__wakeup_writer = socket.socketpair()
+        self.__wakeup_reader.setblocking(False)
+        self.__wakeup_writer.setblocking(False)
+        self.selector.register(self.__wakeup_reader, selectors.EVENT_READ, None)
+
+    @staticmethod
+    def is_supported(ser):
+        """Returns whether the port can be waited on with a selector
+
+        :param ser: Opened serial port
+        :return: true if the port exposes a selectable file descriptor
+        :rtype: bool
+        """
+        return not sys.platform.startswith("win") and hasattr(ser, "fileno")
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def is_alive(self):
+        """Returns whether the reactor thread is serving its ports
+
+        :rtype: bool
+        """
+        return self.running and self.thread is not None and self.thread.is_alive()
+
+    def stop(self):
+        self.running = False
+        self.__wakeup()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def close(self):
+        self.stop()
+        while self.__pending:
+            callback, args = self.__pending.popleft()
+            self.__dispatch(callback, args)
+        for ser in list(self.__ports):
+            self.__remove_port(ser)
+        self.selector.close()
+        self.__wakeup_reader.close()
+        self.__wakeup_writer.close()
+
+    def call_soon(self, callback, *args):
+        self.__pending.append((callback, args))
+        self.__wakeup()
+
+    def add_port(self, ser, callback):
+        """Call callback(ser) on the reactor thread whenever ser is readable"""
+        self.call_soon(self.__add_port, ser, ser.fileno(), callback)
+
+    def remove_port(self, ser, close=True):
+        """Stop watching ser and close it on the reactor thread"""
+        self.call_soon(self.__remove_port, ser, close)
+
+    def call_later(self, delay, callback, *args):
+        """Schedule callback(*args) after delay seconds
+
+        :return: Timer handle which can be passed to cancel()
+        """
+        timer = [time.monotonic() + delay, next(self.__sequence), callback, args]
+        self.call_soon(heapq.heappush, self.timers, timer)
+        return timer
+
+    @staticmethod
+    def cancel(timer):
+        timer[2] = None
+
+    def run(self):
+        while self.running:
+            timeout = None
+            if self.timers:
+                timeout = max(0, self.timers[0][0] - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    self.__drain_wakeup()
+                    continue
+                ser, callback = key.data
+                if not self.__dispatch(callback, (ser,)):
+                    # Stop polling a port whose callback fails, the owner closes it
+                    self.__remove_port(ser, close=False)
+            while self.__pending:
+                callback, args = self.__pending.popleft()
+                self.__dispatch(callback, args)
+            now = time.monotonic()
+            while self.timers and self.timers[0][0] <= now:
+                _, _, callback, args = heapq.heappop(self.timers)
+                if callback is not None:
+                    self.__dispatch(callback, args)
+
+    @staticmethod
+    def __dispatch(callback, args):
+        # One failing port must not take down the thread serving the others
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Reactor callback {getattr(callback, '__name__', callback)} failed: {e!r}")
+            return False
+        return True
+
+    def __add_port(self, ser, fd, callback):
+        self.selector.register(fd, selectors.EVENT_READ, (ser, callback))
+        self.__ports[ser] = fd
+
+    def __remove_port(self, ser, close=True):
+        # The port may already be closed (unplugged), so unregister by the
+        # descriptor it had when it was added rather than asking it again
+        fd = self.__ports.pop(ser, None)
+        if fd is not None:
             try:
-                return func(*args, **kwargs)
-            except exception_to_catch:
-                return wrapper(*args, **kwargs)
-        return wrapper
-    return decorator
+                self.selector.unregister(fd)
+            except (KeyError, ValueError, OSError):
+                pass
+        if close:
+            try:
+                ser.close()
+            except (serial.SerialException, OSError) as e:
+                print(f"Closing {getattr(ser, 'port', ser)} failed: {e!r}")
+
+    def __wakeup(self):
+        try:
+            self.__wakeup_writer.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    def __drain_wakeup(self):
+        try:
+            while self.__wakeup_reader.recv(4096):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+
+class Network_reset_result:
+    """Outcome of a network module reset on a single port"""
+    COMPLETE = "complete"
+    TIMEOUT = "timeout"
+    NOT_CONNECTED = "not connected"
+    OPEN_ERROR = "open error"
+    DISCONNECTED = "disconnected"
+    SKIPPED = "skipped"
+
+    def __init__(self, port=None):
+        self.port = port
+        self.outcome = None
+        self.uuid = 0
+        self.retries = 0
+        self.elapsed = 0.0
+        self.detect_time = None
+        self.probe_latency = None
+        self.firmware_version = None
+        self.reset_latency = None
+        self.frame_errors = {}
+
+    @property
+    def is_complete(self):
+        return self.outcome == self.COMPLETE
+
+    def to_dict(self):
+        return {
+            "port": self.port,
+            "outcome": self.outcome,
+            "uuid": self.uuid,
+            "retries": self.retries,
+            "elapsed": self.elapsed,
+            "detect_time": self.detect_time,
+            "probe_latency": self.probe_latency,
+            "firmware_version": self.firmware_version,
+            "reset_latency": self.reset_latency,
+            "frame_errors": self.frame_errors,
+        }
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(port={self.port!r}, "
+            f"outcome={self.outcome!r}, uuid={hex(self.uuid)}, "
+            f"retries={self.retries}, elapsed={self.elapsed:.3f})"
+        )
+
 
 class Network_reset_manager:
     """Module Firmware Updater: Updates a firmware of given module"""
+    MESSAGE_KINDS = ("error", "state", "done")
+
     SERIAL_MODE_COMPORT = 1
     SERIAL_MODI_WINUSB = 2
     
@@ -53,254 +270,468 @@ class Network_reset_manager:
 
 # self.signal_list[2].emit(100," ")
     def __init__(
-        self, port=None, conn_type="ser"
+        self, port=None, conn_type="ser", reactor=None, ser=None, keep_open=False
     ):
         self.print = True
         self.conn_type = conn_type
 
         self.app_version = 8192
 
-        self.line = [] #라인 단위로 데이터 가져올 리스트 변수
-        self.serial_port = None
+        self.frame_buffer = FrameBuffer()
+        self.read_stats = {"chunks": 0, "frames": 0, "frame_latency": 0.0, "cpu_time": 0.0}
+        self.serial_port = port
         self.baud = 115200
+        self.read_timeout = 0.1
+        self.type = self.SERIAL_MODE_COMPORT
         self.exitThread = False   # 쓰레드 종료용 변수
         self.file_name = ""
         self.start_flag = False
         self.signal_list = []
+        self.message_callback = None
         self.target_module_health_flag = False
         self.target_uuid = 0
         self.target_id = 0
         self.nvs_reset_timeout_thread = None
-        
+        self.timeout_count = 0
+        self.retry_policy = RetryPolicy()
+        self.reset_start = None
+        self.reset_wake_time = None
+        # Fits retry_policy to the firmware version of each module
+        self.latency_model = get_latency_model()
+        # Optional trace_util.Tracer recording the phases and frames of the reset
+        self.tracer = None
+        # Optional capture_util.CaptureWriter recording the raw bytes on the port
+        self.capture = None
+        self.probe_interval = 0.5
+        self.probe_time = None
+        self.next_probe_time = 0
+        self.reactor = reactor
+        self.reset_timer = None
+        self.read_thread = None
+        # A port handed in by a session stays open after the reset
+        self.ser = ser
+        self.keep_open = keep_open or ser is not None
+        self.result = Network_reset_result(port)
+        self.done_event = threading.Event()
+        self.done_callbacks = []
+        # __finish runs on the reader, timeout and stop() threads, the
+        # first one to claim it decides the outcome
+        self.__finish_lock = threading.Lock()
+        self.__finished = False
+        self.skip_uuids = set()
+        self.requests = RequestTracker()
+        self.reset_request = None
+        # Health replies per module id are at most min_interval apart
+        self.health_replies = SourceRateLimiter(min_interval=0.5)
+        self.dispatcher = Dispatcher()
+        self.dispatcher.register(HEALTH, self.__on_health)
+        self.dispatcher.register(ASSIGN_ID, self.__on_assign_id)
+        self.dispatcher.register(WARNING, self.__on_warning)
+        self.start_time = time.perf_counter()
+
     def __del__(self):
         try:
             self.close()
         except serial.SerialException:
             self.__print("Magic del is called with an exception")
 
-    def parse_message(self, command: int, source: int, destination: int,
-                    byte_data: bytes):
-        message = dict()
-        message['c'] = command
-        message['s'] = source
-        message['d'] = destination
-        message['b'] = self.__encode_bytes(byte_data)
-        message['l'] = len(byte_data)
-        return json.dumps(message, separators=(",", ":"))
-
-    def __encode_bytes(self, byte_data: bytes):
-        idx = 0
-        data = bytearray(len(byte_data))
-        while idx < len(byte_data):
-            if not byte_data[idx]:
-                idx += 1
-            elif byte_data[idx] > 256:
-                length = self.__extract_length(idx, byte_data)
-                data[idx: idx + length] = int.to_bytes(
-                    byte_data[idx], byteorder='little', length=length, signed=True
-                )
-                idx += length
-            elif byte_data[idx] < 0:
-                data[idx: idx + 4] = int.to_bytes(
-                    int(byte_data[idx]), byteorder='little', length=4, signed=True
-                )
-                idx += 4
-            elif byte_data[idx] < 256:
-                data[idx] = int(byte_data[idx])
-                idx += 1
-        return b64encode(bytes(data)).decode('utf8')
-
-    def __extract_length(self, begin: int, src: bytes) -> int:
-        length = 1
-        for i in range(begin + 1, len(src)):
-            if not src[i]:
-                length += 1
-            else:
-                break
-        return length
-
     def uuid_to_module_type(self, uuid):
-        module_type_temp = (uuid >> 32) & 0xFFFF
-        if module_type_temp == 0x0000:
-            return "Network"
-        elif module_type_temp == 0x0010:
-            return "Battery"
-        elif module_type_temp == 0x2000:
-            return "Env"
-        elif module_type_temp == 0x2010:
-            return "Gyro"
-        elif module_type_temp == 0x2030:
-            return "Button"
-        elif module_type_temp == 0x2040:
-            return "Dial"
-        elif module_type_temp == 0x2070:
-            return "Joystick"
-        elif module_type_temp == 0x2080:
-            return "ToF"
-        elif module_type_temp == 0x4000:
-            return "Display"
-        elif module_type_temp == 0x4010:
-            return "MotorA"
-        elif module_type_temp == 0x4011:
-            return "MotorB"
-        elif module_type_temp == 0x4020:
-            return "Led"
-        elif module_type_temp == 0x4030:
-            return "Speaker"
-        return "none"
-
-    def type_to_module_uuid(self, uuid):
-        if uuid == "Network":
-            return 0x0000
-        elif uuid == "Battery":
-            return 0x0010
-        elif uuid ==  "Env":
-            return 0x2000
-        elif uuid == "Gyro":
-            return 0x2010
-        elif uuid == "Button":
-            return 0x2030
-        elif uuid == "Dial":
-            return 0x2040
-        elif uuid == "Joystick":
-            return 0x2070
-        elif uuid == "ToF":
-            return 0x2080
-        elif uuid == "Display":
-            return 0x4000
-        elif uuid == "MotorA":
-            return 0x4010
-        elif uuid == "MotorB":
-            return 0x4011
-        elif uuid == "Led":
-            return 0x4020
-        elif uuid == "Speaker":
-            return 0x4030
-        return 1
+        return LEGACY_MODULE_TYPES.get(get_type_code(uuid), "none")
+
+    def type_to_module_uuid(self, module_type):
+        return LEGACY_MODULE_TYPE_CODES.get(module_type, 1)
 
     def version_to_int(self, version):
         version_value = version[1:].split(".")
         return int(version_value[0]) << 13 | int(version_value[1]) << 8 | int(version_value[2])
     
-    def parsing_data(self, data, ser):
-        tmp = ''.join(data)
-        
-        jsonObject = json.loads(tmp)
-
-        cmd = jsonObject.get("c")
-        sid = jsonObject.get("s")
-        did = jsonObject.get("d")
-        length = jsonObject.get("l")
-        data = b64decode(jsonObject.get("b"))
-
-        # if cmd != 0 :
-        # print(tmp)
-        
-        if cmd == 0x0:  # health
-            if self.start_flag == False:
-                send_data = int.to_bytes(0xFFF, byteorder="little", length=8)
-                ser.write(parse_message(0x28, 0x0, sid, send_data).encode('utf-8'))
-        elif cmd == 0x05: # assign id
-            if self.start_flag == False:
-                received_uuid = int.from_bytes(data, byteorder='little') & 0xFFFFFFFFFFFF
-                print(self.uuid_to_module_type(received_uuid), " module detected, uuid = ", hex(received_uuid))
-                if self.uuid_to_module_type(received_uuid) == "Network":
-                    self.start_flag = True
-                    self.target_uuid = received_uuid
-                    self.target_id = self.target_uuid & 0xFFF
-                    send_data = int.to_bytes(0, byteorder="little", length=1)
-                    ser.write(parse_message(0x04, 30, self.target_id, send_data).encode('utf-8')) # Reset
-                    self.signal_list[1].emit("module detected")
-                    self.nvs_reset_timeout_thread.start()
-        elif cmd == 0x0A:
-            print("warning")
-        elif cmd == 0xA1:
-            if self.start_flag == True:
-                if sid == 9: # esp32 version
-                    self.signal_list[1].emit("reset complete\npress the button")
-                    self.signal_list[2].emit()
-                    self.start_flag = False
-                    ser.close()
-                    self.exitThread = True
+    def parsing_data(self, frame, ser):
+        size = len(frame)
+        tracer = self.tracer
+        if tracer is None:
+            frame = try_decode_frame(frame)
+            if frame is None:
+                self.frame_buffer.count_error("decode")
+                return
+            if frame.length != len(frame.data):
+                self.frame_buffer.count_error("length")
+            self.requests.resolve(frame)
+            self.dispatcher.dispatch(frame, size, ser)
+            return
+        decode_start = tracer.now()
+        frame = try_decode_frame(frame)
+        dispatch_start = tracer.now()
+        tracer.span(self.serial_port, "decode", decode_start, dispatch_start)
+        if frame is None:
+            self.frame_buffer.count_error("decode")
+            return
+        if frame.length != len(frame.data):
+            self.frame_buffer.count_error("length")
+        self.requests.resolve(frame)
+        self.dispatcher.dispatch(frame, size, ser)
+        tracer.span(self.serial_port, "dispatch", dispatch_start,
+                    args={"command": frame.command, "source": frame.source})
+
+    def register_handler(self, command, handler):
+        """Handle every received frame of a command with handler(frame, ser)
+
+        :return: The handler it replaces, None if there was none
+        """
+        return self.dispatcher.register(command, handler)
+
+    def __on_health(self, frame, ser):
+        # Every module on the chain reports health, one reply per interval
+        # is enough and keeps the link free for the reset command
+        if self.start_flag == False and self.health_replies.allow(
+            frame.source, time.perf_counter()
+        ):
+            self.__write(ser, HEALTH_REPLY_MESSAGE.encode(frame.source), "health reply")
+
+    def __on_assign_id(self, frame, ser):
+        if self.start_flag == False:
+            received_uuid = int.from_bytes(frame.data, byteorder='little') & 0xFFFFFFFFFFFF
+            module_type = self.uuid_to_module_type(received_uuid)
+            print(module_type, " module detected, uuid = ", hex(received_uuid))
+            if module_type == "Network" and received_uuid in self.skip_uuids:
+                print(hex(received_uuid), " is already reset")
+                self.result.uuid = received_uuid
+                self.__finish(Network_reset_result.SKIPPED)
+            elif module_type == "Network":
+                self.start_flag = True
+                self.target_uuid = received_uuid
+                self.target_id = self.target_uuid & 0xFFF
+                version = int.from_bytes(frame.data[6:8], byteorder='little')
+                self.result.firmware_version = version_to_string(version)
+                if self.latency_model is not None:
+                    self.retry_policy = self.latency_model.retry_policy(
+                        self.result.firmware_version, self.retry_policy
+                    )
+                self.reset_start = time.perf_counter()
+                # The esp32 reports its version once the reset is done
+                self.reset_request = self.request(
+                    RESET_MESSAGE.encode(self.target_id), VERSION,
+                    source=ESP32_ID, ser=ser, name="reset",
+                )
+                self.reset_request.add_done_callback(self.__on_reset_reply)
+                self.__on_detected(received_uuid)
+                self.__emit(1, "module detected")
+                self.__start_reset_timeout(ser)
+
+    def __on_warning(self, frame, ser):
+        print("warning")
+
+    def request(self, message, command, source=None, destination=None,
+                timeout=None, ser=None, name=None):
+        """Write message and return a future for its (command, source, destination) reply
+
+        Any number of requests can be outstanding at once. A request with a
+        timeout fails with TimeoutError once its deadline passes.
+
+        :param name: Name of the message in the trace, the reply command if None
+        :return: PendingRequest
+        """
+        ser = ser if ser is not None else self.ser
+        # Registered before writing so a fast reply cannot be missed
+        pending = self.requests.expect(command, source, destination, timeout)
+        self.__write(ser, message, name or f"request {hex(command)}")
+        if timeout is not None and self.reactor is not None:
+            self.reactor.call_later(timeout, self.requests.expire)
+        return pending
+
+    def __on_reset_reply(self, reset_request):
+        if reset_request.cancelled() or reset_request.exception() is not None:
+            return
+        # Measured from the first reset command whichever one was answered,
+        # so units slower than the first resend are learned as well
+        self.result.reset_latency = time.perf_counter() - self.reset_start
+        if self.latency_model is not None:
+            self.latency_model.record(
+                self.result.firmware_version, self.result.reset_latency
+            )
+        self.__emit(1, "reset complete\npress the button")
+        self.__emit(2)
+        self.__finish(Network_reset_result.COMPLETE)
+
+    def __write(self, ser, message, name):
+        if self.tracer is None:
+            ser.write(message)
+            return
+        write_start = self.tracer.now()
+        ser.write(message)
+        self.tracer.span(self.serial_port, f"write {name}", write_start,
+                         args={"bytes": len(message)})
 
+    def __on_detected(self, uuid):
+        if self.tracer is not None:
+            self.tracer.mark(self.serial_port, "detected", {"uuid": hex(uuid)})
+        now = time.perf_counter()
+        self.result.uuid = uuid
+        self.result.detect_time = now - self.start_time
+        # An assign-id message right after a probe is taken as its reply
+        if self.probe_time is not None and now - self.probe_time < self.probe_interval:
+            self.result.probe_latency = now - self.probe_time
 
     def readThread(self, ser):
-        json_flag = False
+        read_start = time.thread_time()
         while not self.exitThread:
-            for c in ser.read(1):
-                if json_flag == False:
-                    if chr(c) == '{':
-                        self.line.append(chr(c))
-                        json_flag = True
-                else :
-                    self.line.append(chr(c))
-                    if chr(c) == '}':
-                        try:
-                            json_flag = False
-                            self.parsing_data(self.line, ser)
-                        except Exception as e:
-                            del self.line[:]
-                            error_string = repr(e)
-                            print(error_string)
-                            if "The version of this module" in error_string:
-                                raise e 
-                            elif "Streaming response error" in error_string:
-                                raise e
-                        del  self.line[:]
+            try:
+                if not self.start_flag and time.perf_counter() >= self.next_probe_time:
+                    self.request_network_id(ser)
+                    self.next_probe_time = self.probe_time + self.probe_interval
+                if self.type == self.SERIAL_MODI_WINUSB:
+                    data = ser.read_all()
+                else:
+                    # Blocks for up to read_timeout until the first byte arrives
+                    data = ser.read(ser.in_waiting or 1)
+            except (serial.SerialException, OSError) as e:
+                if not self.exitThread:
+                    self.__disconnected(e)
+                break
+            if data:
+                self.__handle_chunk(data, ser)
+            self.requests.expire()
+        self.read_stats["cpu_time"] = time.thread_time() - read_start
+        # Closed here rather than by __finish, a port closed under a
+        # blocked read() makes pyserial fail with a TypeError
+        if not self.keep_open:
+            try:
+                ser.close()
+            except (serial.SerialException, OSError) as e:
+                print(repr(e))
+
+    def __on_readable(self, ser):
+        read_start = time.thread_time()
+        try:
+            data = ser.read(ser.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            # An unplugged device fails in_waiting with EIO
+            self.__disconnected(e)
+            return
+        if data:
+            self.__handle_chunk(data, ser)
+        self.read_stats["cpu_time"] += time.thread_time() - read_start
+
+    def __disconnected(self, error):
+        if self.__finished:
+            return
+        print(repr(error))
+        self.__emit(0, f"{self.serial_port} is disconnected")
+        self.__emit(1, "Press the button")
+        self.__emit(2)
+        self.__finish(Network_reset_result.DISCONNECTED)
+
+    def __handle_chunk(self, data, ser):
+        received_time = time.perf_counter()
+        if self.tracer is not None:
+            if self.read_stats["chunks"] == 0:
+                self.tracer.mark(self.serial_port, "first read")
+            self.tracer.mark(self.serial_port, "read", {"bytes": len(data)})
+        self.frame_buffer.feed(data)
+        frames = self.frame_buffer.frames()
+        for frame in frames:
+            if self.exitThread:
+                break
+            try:
+                self.parsing_data(frame, ser)
+            except (serial.SerialException, OSError) as e:
+                self.__disconnected(e)
+                break
+            except Exception as e:
+                # A failing handler must not stop the reader
+                print(repr(e))
+                self.frame_buffer.count_error("handler")
+        self.read_stats["chunks"] += 1
+        self.read_stats["frames"] += len(frames)
+        self.read_stats["frame_latency"] += (time.perf_counter() - received_time) * len(frames)
 
     def nvs_reset_timeout_thread_function(self, ser):
-        timeout_count = 0
-        while not self.exitThread:
-            time.sleep(2)
-            if timeout_count < 3 and self.start_flag == True:
-                send_data = int.to_bytes(0, byteorder="little", length=1)
-                ser.write(parse_message(0x04, 30, self.target_id, send_data).encode('utf-8')) # Reset
-                timeout_count += 1
-            else:
-                if self.start_flag == False:
-                    return
-                print("Timeout error")
-                self.signal_list[0].emit("Timeout error")
-                self.signal_list[1].emit("Press the button")
-                self.signal_list[2].emit()
-                self.exitThread = True
-                ser.close()
+        wake_time = self.reset_wake_time
+        while wake_time is not None:
+            # Woken early by done_event as soon as the reset finishes
+            if self.done_event.wait(max(0.0, wake_time - time.perf_counter())):
+                return
+            wake_time = self.__reset_timeout(ser)
 
-    def start_reset_thread(self):
-        ports = sp.comports()
-        ser = None
+    def __start_reset_timeout(self, ser):
+        self.reset_wake_time = self.retry_policy.next_time(0, self.reset_start, self.reset_start)
+        if self.reactor is None:
+            self.nvs_reset_timeout_thread.start()
+        else:
+            self.__schedule_reset_timer(ser, self.reset_wake_time)
+
+    def __schedule_reset_timer(self, ser, wake_time):
+        if wake_time is not None:
+            delay = max(0.0, wake_time - time.perf_counter())
+            self.reset_timer = self.reactor.call_later(delay, self.__on_reset_timer, ser)
 
-        for port in ports:
-            if (port.vid == 0x2FDE and port.pid == 0x0003):
-                self.serial_port = port.device
+    def __on_reset_timer(self, ser):
+        self.__schedule_reset_timer(ser, self.__reset_timeout(ser))
 
+    def __on_probe_timer(self, ser):
+        # Keep probing until the module answers, passive detection still works
+        if self.exitThread or self.start_flag:
+            return
+        try:
+            self.request_network_id(ser)
+        except (serial.SerialException, OSError) as e:
+            self.__disconnected(e)
+            return
+        self.reactor.call_later(self.probe_interval, self.__on_probe_timer, ser)
+
+    def __reset_timeout(self, ser):
+        """Resend the reset command or give up, returns the next wake up time while retrying"""
+        if self.exitThread or self.start_flag == False:
+            return None
+        now = time.perf_counter()
+        policy = self.retry_policy
+        if not policy.is_over(self.timeout_count, self.reset_start, now):
+            if policy.can_retry(self.timeout_count):
+                try:
+                    self.__write(ser, RESET_MESSAGE.encode(self.target_id), "reset") # Reset
+                except (serial.SerialException, OSError) as e:
+                    self.__disconnected(e)
+                    return None
+                self.timeout_count += 1
+                if self.tracer is not None:
+                    self.tracer.mark(self.serial_port, "retry", {"retries": self.timeout_count})
+                self.result.retries = self.timeout_count
+            return policy.next_time(self.timeout_count, self.reset_start, now)
+        print("Timeout error")
+        self.__emit(0, "Timeout error")
+        self.__emit(1, "Press the button")
+        self.__emit(2)
+        self.__finish(Network_reset_result.TIMEOUT)
+        return None
+
+    def start_reset_thread(self):
+        self.start_time = time.perf_counter()
         if self.serial_port is None:
-            if sys.platform.startswith("win"):
-                from modi2_network_nvs_reset.util.modi_winusb.modi_winusb import list_modi_winusb_paths
-                path_list = list_modi_winusb_paths()
-                for index, value in enumerate(path_list):
-                    self.serial_port = value
-        else:
-            self.type = self.SERIAL_MODE_COMPORT
-            ser = serial.Serial(self.serial_port, self.baud, timeout=0)
+            port_list = list_network_module_ports()
+            if port_list:
+                self.serial_port = port_list[0]
 
         if self.serial_port is None:
             print("Please connect MODI+ Network Module")
-            self.signal_list[0].emit("Please connect MODI+ Network Module")
-            self.signal_list[1].emit("Press the button")
-            self.signal_list[2].emit()
+            self.__emit(0, "Please connect MODI+ Network Module")
+            self.__emit(1, "Press the button")
+            self.__emit(2)
+            self.__finish(Network_reset_result.NOT_CONNECTED)
             return
-        else:
-            if sys.platform.startswith("win"):
-                from modi2_network_nvs_reset.util.modi_winusb.modi_winusb import ModiWinUsbComPort, list_modi_winusb_paths
-                if self.serial_port in list_modi_winusb_paths():
-                    self.type = self.SERIAL_MODI_WINUSB
-                    winusb = ModiWinUsbComPort(path = self.serial_port, baudrate=self.baud, timeout=0)
-                    ser = winusb
 
+        if self.tracer is not None:
+            self.tracer.mark(self.serial_port, self.tracer.START)
+            open_start = self.tracer.now()
+        try:
+            ser = self.ser if self.ser is not None else self.open_port(self.serial_port)
+        except serial.SerialException as e:
+            print(repr(e))
+            self.__emit(0, f"Cannot open {self.serial_port}")
+            self.__emit(1, "Press the button")
+            self.__emit(2)
+            self.__finish(Network_reset_result.OPEN_ERROR)
+            return
+        if self.capture is not None and not isinstance(ser, CaptureSerial):
+            ser = CaptureSerial(ser, self.capture, self.serial_port)
+        self.ser = ser
+        if self.tracer is not None:
+            self.tracer.span(self.serial_port, "port open", open_start)
+        if self.reactor is not None and not self.reactor.is_supported(ser):
+            self.reactor = None
+        if self.reactor is not None:
+            self.reactor.add_port(ser, self.__on_readable)
+            self.reactor.call_soon(self.__on_probe_timer, ser)
+            return
         self.nvs_reset_timeout_thread = threading.Thread(target=self.nvs_reset_timeout_thread_function, args=(ser,), daemon=True)
-        thread1 = threading.Thread(target=self.readThread, args=(ser,), daemon=True)
-        thread1.start()
+        self.read_thread = threading.Thread(target=self.readThread, args=(ser,), daemon=True)
+        self.read_thread.start()
+
+    def open_port(self, port):
+        if sys.platform.startswith("win"):
+            from modi2_network_nvs_reset.util.modi_winusb.modi_winusb import ModiWinUsbComPort
+            if port in get_device_index().list_winusb_paths():
+                self.type = self.SERIAL_MODI_WINUSB
+                return ModiWinUsbComPort(path = port, baudrate=self.baud, timeout=self.read_timeout)
+        self.type = self.SERIAL_MODE_COMPORT
+        return serial.Serial(port, self.baud, timeout=self.read_timeout)
+
+    def __finish(self, outcome):
+        with self.__finish_lock:
+            if self.__finished:
+                return
+            self.__finished = True
+        self.start_flag = False
+        self.exitThread = True
+        self.requests.cancel_all()
+        if self.reactor is not None:
+            if self.reset_timer is not None:
+                self.reactor.cancel(self.reset_timer)
+            if self.ser is not None:
+                self.reactor.remove_port(self.ser, close=not self.keep_open)
+        elif self.ser is not None and not self.keep_open and not self.__is_reading():
+            self.ser.close()
+        self.result.outcome = outcome
+        self.result.elapsed = time.perf_counter() - self.start_time
+        self.result.frame_errors = {
+            kind: count for kind, count in self.frame_buffer.error_counts.items() if count
+        }
+        if self.tracer is not None:
+            self.tracer.mark(self.serial_port, outcome, {"retries": self.result.retries})
+        self.done_event.set()
+        for callback in self.done_callbacks:
+            callback(self.result)
+
+    def __is_reading(self):
+        # The reader thread closes the port itself once it sees exitThread
+        read_thread = self.read_thread
+        return (
+            read_thread is not None and read_thread.is_alive()
+            and read_thread is not threading.current_thread()
+        )
+
+    def __emit(self, index, *args):
+        if index < len(self.signal_list):
+            self.signal_list[index].emit(*args)
+        if self.message_callback is not None:
+            self.message_callback(self.MESSAGE_KINDS[index], *args)
+
+    def wait(self, timeout=None):
+        """Block until the reset on this manager's port has finished
+
+        :param timeout: Seconds to wait, forever if None
+        :type timeout: float
+        :return: True if the reset has finished
+        :rtype: bool
+        """
+        return self.done_event.wait(timeout)
+
+    def wait_detected(self, detect_timeout):
+        """Wait for the reset to finish, aborting it if no network module
+        announces itself within detect_timeout seconds
+
+        :return: Network_reset_result
+        """
+        deadline = self.start_time + detect_timeout
+        while not self.wait(0.1):
+            if not self.start_flag and time.perf_counter() > deadline:
+                self.stop()
+        return self.result
+
+    def join(self, timeout=None):
+        """Wait for the reader thread of a threaded reset to exit"""
+        if self.read_thread is not None and self.read_thread is not threading.current_thread():
+            self.read_thread.join(timeout)
+
+    def add_done_callback(self, callback):
+        """Call callback(result) once the reset has finished
+
+        :param callback: Function taking the Network_reset_result
+        """
+        self.done_callbacks.append(callback)
+
+    def stop(self):
+        """Abort a reset which has not finished yet"""
+        if not self.__finished:
+            self.__finish(Network_reset_result.TIMEOUT)
 
     def set_ui(self, ui):
         self.ui = ui
@@ -310,16 +741,29 @@ class Network_reset_manager:
         self.ui = ui
         self.signal_list = signal_list
 
+    def set_message_callback(self, message_callback):
+        """Report progress to a plain function instead of Qt signals
+
+        :param message_callback: Called as message_callback(kind, *args)
+            where kind is one of MESSAGE_KINDS
+        """
+        self.message_callback = message_callback
+
     def set_print(self, print):
         self.print = print
 
     def set_raise_error(self, raise_error_message):
         self.raise_error_message = raise_error_message
 
-    def request_network_id(self):
-        self.__conn.send_nowait(
-            parse_message(0x28, 0x0, 0xFFF, (0xFF, 0x0F))
-        )
+    def request_network_id(self, ser=None):
+        """Ask every module on the bus to announce its uuid right away
+
+        The modules answer with the assign-id message parsing_data already
+        looks for, so the reset does not wait for the next broadcast.
+        """
+        ser = ser if ser is not None else self.ser
+        self.probe_time = time.perf_counter()
+        self.__write(ser, REQUEST_UUID_MESSAGE.encode(BROADCAST_ID), "probe")
 
     def close(self):
         self.__running = False
@@ -347,10 +791,7 @@ class Network_reset_manager:
 
     @staticmethod
     def __delay(span):
-        init_time = time.perf_counter()
-        while time.perf_counter() - init_time < span:
-            pass
-        return
+        time.sleep(span)
 
     @staticmethod
     def __set_module_state(
@@ -373,4 +814,353 @@ class Network_reset_manager:
 
     def __print(self, data, end="\n"):
         if self.print:
-            print(data, end)
\ No newline at end of file
+            print(data, end)
+
+
+class Network_reset_session:
+    """Long lived reset session which keeps ports open between resets
+
+    Each port is opened on its first reset and the handle is reused by the
+    following ones, so back-to-back resets on one fixture skip the port
+    open and, where the reactor is available, any thread start. A handle
+    is dropped and reopened next time if its device went away. close()
+    stops and joins every worker and closes the pooled ports.
+
+        with Network_reset_session() as session:
+            result = session.reset()
+    """
+
+    def __init__(self, detect_timeout=10, tracer=None, capture=None):
+        self.detect_timeout = detect_timeout
+        self.tracer = tracer
+        self.capture = capture
+        self.reactor = None
+        self.is_open = False
+        self.port_pool = dict()
+        self.managers = []
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self):
+        if self.is_open:
+            return
+        if not sys.platform.startswith("win"):
+            self.reactor = Serial_io_reactor()
+            self.reactor.start()
+        self.is_open = True
+
+    def close(self):
+        if not self.is_open:
+            return
+        for manager in self.managers:
+            manager.stop()
+            manager.join()
+        self.managers = []
+        if self.reactor is not None:
+            self.reactor.close()
+            self.reactor = None
+        for ser, _ in self.port_pool.values():
+            ser.close()
+        self.port_pool.clear()
+        self.is_open = False
+        get_latency_model().save()
+
+    def reset(self, port=None):
+        """Reset the network module on port, or on the first one found
+
+        :param port: Port of the network module
+        :type port: str
+        :return: Network_reset_result
+        """
+        if port is None:
+            port_list = list_network_module_ports()
+            port = port_list[0] if port_list else None
+        return self.reset_all([port])[0]
+
+    def reset_all(self, ports=None):
+        """Reset the network modules on every port in parallel
+
+        :param ports: Ports to reset, every network module port if None
+        :type ports: List[str]
+        :return: List[Network_reset_result]
+        """
+        self.open()
+        if ports is None:
+            ports = list_network_module_ports()
+        pooled_ports = set(self.port_pool)
+        self.managers = [self.__start_reset(port) for port in ports]
+        for index, manager in enumerate(self.managers):
+            manager.wait_detected(self.detect_timeout)
+            manager.join()
+            if manager.result.outcome in (
+                Network_reset_result.DISCONNECTED, Network_reset_result.OPEN_ERROR
+            ):
+                self.__drop_port(manager.serial_port)
+                # The pooled handle may predate a replug, retry on a fresh one
+                if (manager.result.outcome == Network_reset_result.DISCONNECTED
+                        and manager.serial_port in pooled_ports):
+                    manager = self.__start_reset(manager.serial_port)
+                    manager.wait_detected(self.detect_timeout)
+                    manager.join()
+                    self.managers[index] = manager
+        return [manager.result for manager in self.managers]
+
+    def __start_reset(self, port):
+        pooled = self.port_pool.get(port)
+        if pooled is None:
+            manager = Network_reset_manager(port=port, reactor=self.reactor, keep_open=True)
+            manager.tracer = self.tracer
+            manager.capture = self.capture
+            manager.start_reset_thread()
+            if manager.ser is not None:
+                self.port_pool[manager.serial_port] = manager.ser, manager.type
+            return manager
+        ser, ser_type = pooled
+        try:
+            # Drop frames which arrived between two resets
+            ser.reset_input_buffer()
+        except Exception:
+            # The device behind the pooled handle is gone, open it again
+            self.__drop_port(port)
+            return self.__start_reset(port)
+        manager = Network_reset_manager(port=port, reactor=self.reactor, ser=ser)
+        manager.type = ser_type
+        manager.tracer = self.tracer
+        manager.capture = self.capture
+        manager.start_reset_thread()
+        return manager
+
+    def __drop_port(self, port):
+        pooled = self.port_pool.pop(port, None)
+        if pooled is not None:
+            pooled[0].close()
+
+
+class Network_reset_fleet_manager:
+    """Resets every attached network module in parallel"""
+
+    def __init__(self, ports=None, detect_timeout=10, session=None, tracer=None,
+                 capture=None):
+        self.ports = ports
+        self.detect_timeout = detect_timeout
+        self.session = session
+        self.tracer = tracer
+        self.capture = capture
+        self.signal_list = []
+        self.message_callback = None
+        self.managers = []
+        self.results = []
+
+    def start_reset_thread(self):
+        ports = self.ports if self.ports else list_network_module_ports()
+        if not ports:
+            print("Please connect MODI+ Network Module")
+            self.__emit(0, "Please connect MODI+ Network Module")
+            self.__emit(1, "Press the button")
+            self.__emit(2)
+            return []
+
+        print(f"{len(ports)} network module(s) found")
+        self.__emit(1, f"processing {len(ports)} module(s)")
+        if self.session is not None:
+            self.session.reset_all(ports)
+            self.managers = self.session.managers
+        else:
+            with Network_reset_session(
+                detect_timeout=self.detect_timeout, tracer=self.tracer,
+                capture=self.capture,
+            ) as session:
+                session.reset_all(ports)
+                self.managers = session.managers
+
+        self.results = [manager.result for manager in self.managers]
+        for result in self.results:
+            print(f"{result.port}: {result.outcome} (uuid = {hex(result.uuid)}, "
+                  f"{result.elapsed:.2f}s, {result.retries} retries)")
+
+        failed = [result for result in self.results if not result.is_complete]
+        if failed:
+            error_message = "\n".join(
+                f"{result.port}: {result.outcome}" for result in failed
+            )
+            self.__emit(0, error_message)
+            self.__emit(1, f"{len(self.results) - len(failed)}/{len(self.results)} reset complete\npress the button")
+        elif len(self.results) == 1:
+            self.__emit(1, "reset complete\npress the button")
+        else:
+            self.__emit(1, f"{len(self.results)} reset complete\npress the button")
+        self.__emit(2)
+        return self.results
+
+    def set_ui(self, ui, signal_list):
+        self.ui = ui
+        self.signal_list = signal_list
+
+    def set_message_callback(self, message_callback):
+        self.message_callback = message_callback
+
+    def __emit(self, index, *args):
+        if index < len(self.signal_list):
+            self.signal_list[index].emit(*args)
+        if self.message_callback is not None:
+            self.message_callback(Network_reset_manager.MESSAGE_KINDS[index], *args)
+
+
+class Network_reset_station:
+    """Resets every network module as it is plugged in, without a button click
+
+    Attached ports are read from the device index. A port is reset once
+    and then left alone until it is unplugged. A module whose uuid was
+    already reset in this session is skipped, even if it shows up again on
+    another port.
+    """
+
+    def __init__(self, poll_interval=0.25, attach_delay=0.5, detect_timeout=10,
+                 list_ports=None, tracer=None, capture=None):
+        self.list_ports = list_ports
+        self.tracer = tracer
+        self.capture = capture
+        self.poll_interval = poll_interval
+        self.attach_delay = attach_delay
+        self.detect_timeout = detect_timeout
+        self.signal_list = []
+        self.message_callback = None
+        self.result_callbacks = []
+        self.managers = dict()
+        self.results = []
+        self.reset_uuids = set()
+        self.complete_count = 0
+        self.failure_count = 0
+        self.skip_count = 0
+        self.start_time = None
+        self.__finished_ports = set()
+        self.__attach_times = dict()
+        self.__lock = threading.Lock()
+        self.__stop_event = threading.Event()
+        self.__thread = None
+
+    def start(self):
+        if self.__thread is not None:
+            return
+        self.start_time = time.perf_counter()
+        self.__stop_event.clear()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+        self.__emit(1, "waiting for modules")
+
+    def stop(self):
+        self.__stop_event.set()
+        if self.__thread is not None and self.__thread is not threading.current_thread():
+            self.__thread.join()
+        self.__thread = None
+        get_latency_model().save()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0
+        return {
+            "complete": self.complete_count,
+            "failed": self.failure_count,
+            "skipped": self.skip_count,
+            "elapsed": elapsed,
+            "units_per_hour": self.complete_count * 3600 / elapsed if elapsed else 0.0,
+        }
+
+    def add_result_callback(self, callback):
+        """Call callback(result) for every module the station has handled"""
+        self.result_callbacks.append(callback)
+
+    def set_ui(self, ui, signal_list):
+        self.ui = ui
+        self.signal_list = signal_list
+
+    def set_message_callback(self, message_callback):
+        self.message_callback = message_callback
+
+    def __run(self):
+        reactor = None
+        if not sys.platform.startswith("win"):
+            reactor = Serial_io_reactor()
+            reactor.start()
+        list_ports = self.list_ports or get_device_index().network_module_ports
+        while not self.__stop_event.wait(self.poll_interval):
+            if reactor is not None and not reactor.is_alive():
+                reactor = self.__restart_reactor(reactor)
+            attached = set(list_ports())
+            now = time.perf_counter()
+            with self.__lock:
+                # An unplugged port is reset again once something is plugged in
+                self.__finished_ports &= attached
+                for port in list(self.__attach_times):
+                    if port not in attached:
+                        del self.__attach_times[port]
+                new_ports = attached - self.__finished_ports - set(self.managers)
+            for port in new_ports:
+                attach_time = self.__attach_times.setdefault(port, now)
+                if now - attach_time >= self.attach_delay:
+                    self.__start_reset(port, reactor)
+            for manager in list(self.managers.values()):
+                if not manager.start_flag and now - manager.start_time > self.detect_timeout:
+                    manager.stop()
+
+        for manager in list(self.managers.values()):
+            manager.stop()
+        if reactor is not None:
+            reactor.close()
+
+    def __restart_reactor(self, reactor):
+        print("Serial reactor stopped, restarting it")
+        self.__emit(0, "Serial reactor stopped, restarting it")
+        # Resets on the dead reactor cannot progress, end them and close
+        # their ports from here before serving new ones
+        for manager in list(self.managers.values()):
+            if manager.reactor is reactor:
+                manager.stop()
+        try:
+            reactor.close()
+        except Exception as e:
+            print(repr(e))
+        reactor = Serial_io_reactor()
+        reactor.start()
+        return reactor
+
+    def __start_reset(self, port, reactor):
+        manager = Network_reset_manager(port=port, reactor=reactor)
+        manager.skip_uuids = self.reset_uuids
+        manager.tracer = self.tracer
+        manager.capture = self.capture
+        manager.add_done_callback(self.__on_result)
+        with self.__lock:
+            self.managers[port] = manager
+            self.__attach_times.pop(port, None)
+        manager.start_reset_thread()
+
+    def __on_result(self, result):
+        with self.__lock:
+            self.managers.pop(result.port, None)
+            self.__finished_ports.add(result.port)
+            self.results.append(result)
+            if result.is_complete:
+                self.complete_count += 1
+                self.reset_uuids.add(result.uuid)
+            elif result.outcome == Network_reset_result.SKIPPED:
+                self.skip_count += 1
+            else:
+                self.failure_count += 1
+        print(f"{result.port}: {result.outcome} (uuid = {hex(result.uuid)}, "
+              f"{result.elapsed:.2f}s, {result.retries} retries)")
+        stats = self.stats()
+        self.__emit(1, f"{stats['complete']} reset, {stats['failed']} failed\n"
+                       f"{stats['units_per_hour']:.0f} units/hour")
+        for callback in self.result_callbacks:
+            callback(result)
+
+    def __emit(self, index, *args):
+        if index < len(self.signal_list) and self.signal_list[index] is not None:
+            self.signal_list[index].emit(*args)
+        if self.message_callback is not None:
+            self.message_callback(Network_reset_manager.MESSAGE_KINDS[index], *args)
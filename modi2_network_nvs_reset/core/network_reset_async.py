@@ -0,0 +1,142 @@
+import asyncio
+import sys
+import time
+from typing import List, Optional
+
+from modi2_network_nvs_reset.core.network_reset import (
+    Network_reset_manager, Network_reset_result, list_network_module_ports)
+
+# Seconds the watchdog of a reset waits between checks
+WATCHDOG_INTERVAL = 0.5
+# Seconds allowed past the retry schedule before a reset is given up
+RETRY_GRACE = 1.0
+
+
+class Asyncio_serial_reactor:
+    """Drives Network_reset_manager ports and timers from an asyncio loop
+
+    Implements the same interface as Serial_io_reactor on top of
+    loop.add_reader and loop.call_later, so a reset runs as plain callbacks
+    on the event loop without any extra thread.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.__ports = dict()
+
+    def is_supported(self, ser) -> bool:
+        if sys.platform.startswith("win") or not hasattr(ser, "fileno"):
+            return False
+        # The proactor loop on Windows cannot watch file descriptors
+        return isinstance(self.loop, asyncio.SelectorEventLoop)
+
+    def add_port(self, ser, callback) -> None:
+        fd = ser.fileno()
+        self.loop.add_reader(fd, callback, ser)
+        self.__ports[ser] = fd
+
+    def remove_port(self, ser, close=True) -> None:
+        self.loop.call_soon_threadsafe(self.__remove_port, ser, close)
+
+    def call_soon(self, callback, *args) -> None:
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        return self.loop.call_later(delay, callback, *args)
+
+    @staticmethod
+    def cancel(timer) -> None:
+        timer.cancel()
+
+    def __remove_port(self, ser, close=True):
+        # A hung up descriptor stays readable, so the reader goes even when
+        # the port was already closed by the disconnect
+        fd = self.__ports.pop(ser, None)
+        if fd is not None:
+            self.loop.remove_reader(fd)
+        if close and ser.is_open:
+            try:
+                ser.close()
+            except OSError as e:
+                print(f"Closing {getattr(ser, 'port', ser)} failed: {e!r}")
+
+
+async def reset_network_module(
+    port: Optional[str] = None, detect_timeout: float = 10
+) -> Network_reset_result:
+    """Reset the network module on port, or on the first one found
+
+    :param port: Port of the network module
+    :type port: str
+    :param detect_timeout: Seconds to wait for the module to announce itself
+    :type detect_timeout: float
+    :return: Network_reset_result
+    """
+    loop = asyncio.get_running_loop()
+    if port is None:
+        port_list = await loop.run_in_executor(None, list_network_module_ports)
+        if not port_list:
+            result = Network_reset_result()
+            result.outcome = Network_reset_result.NOT_CONNECTED
+            return result
+        port = port_list[0]
+
+    reactor = Asyncio_serial_reactor(loop)
+    manager = Network_reset_manager(port=port, reactor=reactor)
+    finished = loop.create_future()
+
+    def on_finish(result):
+        loop.call_soon_threadsafe(
+            lambda: finished.done() or finished.set_result(result)
+        )
+
+    watchdog = None
+
+    def on_watchdog():
+        # A module which never announces itself, or a reset whose retry
+        # timers stopped, would otherwise be awaited forever
+        nonlocal watchdog
+        now = time.perf_counter()
+        if not manager.start_flag:
+            deadline = manager.start_time + detect_timeout
+        else:
+            max_elapsed = manager.retry_policy.max_elapsed()
+            deadline = None if max_elapsed is None else (
+                manager.reset_start + max_elapsed + RETRY_GRACE
+            )
+        if deadline is not None and now >= deadline:
+            manager.stop()
+            return
+        delay = WATCHDOG_INTERVAL if deadline is None else deadline - now
+        watchdog = loop.call_later(min(delay, WATCHDOG_INTERVAL), on_watchdog)
+
+    manager.add_done_callback(on_finish)
+    manager.start_reset_thread()
+    on_watchdog()
+    try:
+        return await finished
+    except asyncio.CancelledError:
+        manager.stop()
+        raise
+    finally:
+        if watchdog is not None:
+            watchdog.cancel()
+
+
+async def reset_all(
+    ports: Optional[List[str]] = None, detect_timeout: float = 10
+) -> List[Network_reset_result]:
+    """Reset every attached network module concurrently
+
+    :param ports: Ports to reset, every network module port if None
+    :type ports: List[str]
+    :param detect_timeout: Seconds to wait for each module to announce itself
+    :type detect_timeout: float
+    :return: List[Network_reset_result]
+    """
+    if ports is None:
+        loop = asyncio.get_running_loop()
+        ports = await loop.run_in_executor(None, list_network_module_ports)
+    return list(await asyncio.gather(
+        *(reset_network_module(port, detect_timeout) for port in ports)
+    ))
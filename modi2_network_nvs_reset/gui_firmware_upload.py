@@ -19,7 +19,9 @@ from PyQt5.QtWidgets import QDialog, QFileDialog
 
 from modi2_network_nvs_reset.util.connection_util import list_modi_ports
 # from modi2_network_nvs_reset.core.network_uploader import NetworkFirmwareMultiUpdater
-from modi2_network_nvs_reset.core.network_reset import Network_reset_manager
+from modi2_network_nvs_reset.core.network_reset import (Network_reset_fleet_manager,
+                                                       Network_reset_session,
+                                                       Network_reset_station)
 
 
 class StdoutRedirect(QObject):
@@ -178,6 +180,7 @@ class Form(QDialog):
 
         # Connect up the buttons
         self.ui.nvs_reset_start.clicked.connect(self.reset_network_module)
+        self.ui.station_mode.toggled.connect(self.toggle_station_mode)
 
         self.buttons = [
             self.ui.nvs_reset_start,
@@ -188,6 +191,9 @@ class Form(QDialog):
 
         # Set up field variables
         self.firmware_updater = None
+        self.station = None
+        # Keeps the ports open between clicks
+        self.reset_session = Network_reset_session()
         self.button_in_english = False
         self.console = False
 
@@ -215,13 +221,31 @@ class Form(QDialog):
         print("button clicked")
         self.ui.process_state.setText("processing")
         self.ui.nvs_reset_start.setEnabled(False)
-        nvs_reset_manager = Network_reset_manager()
+        nvs_reset_manager = Network_reset_fleet_manager(session=self.reset_session)
         nvs_reset_manager.set_ui(self.ui, self.test_signal_list)
         th.Thread(
             target=nvs_reset_manager.start_reset_thread,
             daemon=True,
         ).start()
 
+    def toggle_station_mode(self, checked):
+        if checked:
+            print("station mode started")
+            self.ui.nvs_reset_start.setEnabled(False)
+            # The station opens the ports itself
+            self.reset_session.close()
+            self.station = Network_reset_station()
+            # Only the state label, a popup per failed unit would stall the line
+            self.station.set_ui(self.ui, [None, self.button_text_change_signal])
+            self.station.start()
+        else:
+            if self.station is not None:
+                self.station.stop()
+                print(f"station mode stopped: {self.station.stats()}")
+                self.station = None
+            self.ui.process_state.setText("Press the button")
+            self.ui.nvs_reset_start.setEnabled(True)
+
     def specific_file_button_event(self):
         fname = QFileDialog.getOpenFileNames(self, 'Open files', './')
         print(fname)
@@ -0,0 +1,212 @@
+"""Raw serial capture in a compact append-only binary log
+
+A capture starts with MAGIC, then holds one record per chunk:
+
+    <Q timestamp_ns> <B direction> <H port> <I length> <length bytes>
+
+all little endian. The timestamp is time.monotonic_ns(). Direction is
+IN for bytes read from the port and OUT for bytes written to it. A PORT
+record, written once per port before its first chunk, carries the
+device name of the port index in its data.
+"""
+import struct
+import threading
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+MAGIC = b"MODICAP\x01"
+
+IN = 0
+OUT = 1
+PORT = 2
+
+_RECORD_HEADER = struct.Struct("<QBHI")
+
+
+class CaptureRecord(NamedTuple):
+    timestamp: int
+    direction: int
+    port: int
+    data: bytes
+
+
+class CaptureWriter:
+    """Buffers capture records and writes them to disk from its own thread
+
+    record() appends to an in-memory list under a lock which is only ever
+    held to append or to swap the list out, never during file I/O. The
+    file is written by a background thread every flush_interval seconds or
+    as soon as flush_size bytes are buffered, so capturing a full speed
+    link does not put file I/O on the read path. Once a write fails the capture is
+    stopped: failed is set and further records are dropped.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5,
+                 flush_size: int = 1 << 16):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.record_count = 0
+        self.byte_count = 0
+        self.failed = False
+        self.ports: Dict[str, int] = dict()
+        self.__file = open(path, "wb")
+        self.__file.write(MAGIC)
+        self.__pending: List[bytes] = []
+        self.__pending_size = 0
+        self.__lock = threading.Lock()
+        # Keeps flushes from the thread and close() in order on the file
+        self.__io_lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__running = True
+        self.__closed = False
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def port_index(self, port: str) -> int:
+        """Returns the index of a port, adding a PORT record on first use
+
+        :param port: Device name of the port
+        :return: int
+        """
+        index = self.ports.get(port)
+        if index is None:
+            with self.__lock:
+                index = self.ports.get(port)
+                if index is None:
+                    index = self.ports[port] = len(self.ports)
+                    self.__append(PORT, index, str(port).encode("utf8"))
+        return index
+
+    def record(self, direction: int, port: int, data: bytes) -> None:
+        """Buffer one chunk read from or written to a port
+
+        :param direction: IN or OUT
+        :param port: Port index from port_index()
+        :param data: Bytes of the chunk
+        """
+        if not data or self.failed:
+            return
+        with self.__lock:
+            self.__append(direction, port, data)
+        if self.__pending_size >= self.flush_size:
+            self.__wakeup.set()
+
+    def flush(self) -> None:
+        with self.__io_lock:
+            with self.__lock:
+                pending, self.__pending = self.__pending, []
+                self.__pending_size = 0
+            if pending:
+                self.__file.write(b"".join(pending))
+            self.__file.flush()
+
+    def close(self) -> None:
+        if self.__closed:
+            return
+        self.__closed = True
+        self.__running = False
+        self.__wakeup.set()
+        if self.__thread is not threading.current_thread():
+            self.__thread.join()
+        try:
+            if not self.failed:
+                self.flush()
+        except (OSError, ValueError) as e:
+            print(f"Capture to {self.path} stopped: {e!r}")
+        finally:
+            self.__file.close()
+
+    def __append(self, direction, port, data):
+        self.__pending.append(
+            _RECORD_HEADER.pack(time.monotonic_ns(), direction, port, len(data))
+        )
+        self.__pending.append(bytes(data))
+        self.__pending_size += _RECORD_HEADER.size + len(data)
+        self.record_count += 1
+        self.byte_count += len(data)
+
+    def __run(self):
+        while self.__running:
+            self.__wakeup.wait(self.flush_interval)
+            self.__wakeup.clear()
+            try:
+                self.flush()
+            except (OSError, ValueError) as e:
+                print(f"Capture to {self.path} stopped: {e!r}")
+                self.failed = True
+                self.__running = False
+                with self.__lock:
+                    self.__pending = []
+                    self.__pending_size = 0
+
+
+class CaptureSerial:
+    """Serial port wrapper which records every chunk read or written
+
+    Anything other than reading and writing is passed to the wrapped port,
+    so it stands in for serial.Serial or ModiSerialPort wherever they are
+    used, including a selector waiting on its fileno().
+    """
+
+    def __init__(self, ser, writer: CaptureWriter, port: Optional[str] = None):
+        self.ser = ser
+        self.writer = writer
+        self.port_id = writer.port_index(port if port is not None else ser.port)
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        self.writer.record(IN, self.port_id, data)
+        return data
+
+    def read_all(self):
+        data = self.ser.read_all()
+        self.writer.record(IN, self.port_id, data)
+        return data
+
+    def write(self, data):
+        written = self.ser.write(data)
+        self.writer.record(OUT, self.port_id, data)
+        return written
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    """Yield every record of a capture, PORT records included
+
+    A record cut short by a crash ends the capture.
+
+    :param path: Capture file
+    :return: Iterator[CaptureRecord]
+    """
+    with open(path, "rb") as capture_file:
+        if capture_file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a MODI capture")
+        while True:
+            header = capture_file.read(_RECORD_HEADER.size)
+            if len(header) < _RECORD_HEADER.size:
+                return
+            timestamp, direction, port, length = _RECORD_HEADER.unpack(header)
+            data = capture_file.read(length)
+            if len(data) < length:
+                return
+            yield CaptureRecord(timestamp, direction, port, data)
+
+
+def read_port_names(path: str) -> Dict[int, str]:
+    """Returns the device name of every port index in a capture
+
+    :return: Dict[int, str]
+    """
+    return {
+        record.port: record.data.decode("utf8")
+        for record in read_capture(path) if record.direction == PORT
+    }
@@ -1,13 +1,18 @@
 import os
+import threading
 import time
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from collections import deque
+from typing import Callable, List, Optional
 
 import serial
-import serial.tools.list_ports as stl
 from serial.serialutil import SerialException
 from serial.tools.list_ports_common import ListPortInfo
 
+from modi2_network_nvs_reset.util.capture_util import CaptureSerial
+from modi2_network_nvs_reset.util.discovery_util import get_device_index
+from modi2_network_nvs_reset.util.frame_util import FrameBuffer
+
 
 class ConnTask(ABC):
     def __init__(self, verbose=False):
@@ -50,22 +55,116 @@ class ConnTask(ABC):
         Make sure this is attached to inherited send method
         """
 
-        def decorator(self, pkt: str) -> None:
+        def decorator(self, pkt: str, *args, **kwargs) -> None:
             init_time = time.perf_counter()
-            func(self, pkt)
-            while time.perf_counter() - init_time < 0.04:
-                pass
+            func(self, pkt, *args, **kwargs)
+            remaining = 0.04 - (time.perf_counter() - init_time)
+            if remaining > 0:
+                time.sleep(remaining)
 
         return decorator
 
 
+class PacedWriter:
+    """Send queue which writes packets from its own thread at a paced rate
+
+    Pacing is a token bucket refilled at one token per min_interval and
+    holding at most burst tokens. Every write takes as many queued packets
+    as there are tokens and joins them into one write, so with the default
+    burst of 1 the module sees one packet per min_interval, as the firmware
+    expects. The thread sleeps on a condition instead of spinning.
+    """
+
+    def __init__(
+        self, write: Callable[[bytes], object],
+        min_interval: float = 0.04, burst: int = 1,
+    ):
+        self._write = write
+        self.min_interval = min_interval
+        self.burst = burst
+        self.write_count = 0
+        self.packet_count = 0
+        self.__queue = deque()
+        self.__condition = threading.Condition()
+        self.__tokens = float(burst)
+        self.__refill_time = time.monotonic()
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def send(self, data: bytes) -> None:
+        """Queue data to be written, returns immediately
+
+        :param data: Encoded packet
+        :type data: bytes
+        :return: None
+        """
+        with self.__condition:
+            self.__queue.append(data)
+            self.__condition.notify()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued packet has been written
+
+        :return: true if the queue was emptied in time
+        :rtype: bool
+        """
+        with self.__condition:
+            return self.__condition.wait_for(
+                lambda: not self.__queue or not self.__running, timeout
+            )
+
+    def close(self, timeout: Optional[float] = 1.0) -> None:
+        self.flush(timeout)
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify_all()
+        if self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.__tokens = min(
+            self.burst,
+            self.__tokens + (now - self.__refill_time) / self.min_interval,
+        )
+        self.__refill_time = now
+
+    def __run(self) -> None:
+        while True:
+            with self.__condition:
+                while self.__running and not self.__queue:
+                    self.__condition.wait()
+                if not self.__running:
+                    return
+                self.__refill()
+                if self.__tokens < 1:
+                    self.__condition.wait(
+                        (1 - self.__tokens) * self.min_interval
+                    )
+                    continue
+                count = min(len(self.__queue), int(self.__tokens))
+                packets = [self.__queue.popleft() for _ in range(count)]
+                self.__tokens -= count
+            try:
+                self._write(b"".join(packets))
+            except SerialException as e:
+                print(repr(e))
+            self.write_count += 1
+            self.packet_count += count
+            with self.__condition:
+                self.__condition.notify_all()
+
+
 class SerTask(ConnTask):
-    def __init__(self, verbose=False, port=None):
+    def __init__(self, verbose=False, port=None, capture=None):
         if verbose:
             print("Initiating serial connection...")
         super().__init__(verbose)
         self.__port = port
-        self.__json_buffer = b""
+        self.__capture = capture
+        self.__frame_buffer = FrameBuffer()
+        self.__writer = None
 
     #
     # Inherited Methods
@@ -89,6 +188,8 @@ class SerTask(ConnTask):
                 try:
                     self._bus = self.__init_serial(self.__port)
                     self._bus.open()
+                    self.__attach_capture()
+                    self.__writer = PacedWriter(self._bus.write)
                     return
                 except SerialException:
                     raise SerialException(f"{self.__port} is not available.")
@@ -97,6 +198,8 @@ class SerTask(ConnTask):
             self._bus = self.__init_serial(modi_port.device)
             try:
                 self._bus.open()
+                self.__attach_capture()
+                self.__writer = PacedWriter(self._bus.write)
                 if self.verbose:
                     print(f'Serial is open at "{modi_port}"')
                 return
@@ -112,11 +215,18 @@ class SerTask(ConnTask):
         ser.write_timeout = 0
         return ser
 
+    def __attach_capture(self) -> None:
+        if self.__capture is not None:
+            self._bus = CaptureSerial(self._bus, self.__capture)
+
     def close_conn(self) -> None:
         """Close serial port
 
         :return: None
         """
+        if self.__writer is not None:
+            self.__writer.close()
+            self.__writer = None
         self._bus.close()
 
     def recv(self, verbose=False) -> Optional[str]:
@@ -124,25 +234,33 @@ class SerTask(ConnTask):
 
         :return: str
         """
-        buf_temp = self._bus.read_all()
-        self.__json_buffer += buf_temp
-        idx = self.__json_buffer.find(b"{")
-        if idx < 0:
-            self.__json_buffer = b""
-            return None
-        self.__json_buffer = self.__json_buffer[idx:]
-        idx = self.__json_buffer.find(b"}")
-        if idx < 0:
+        self.__frame_buffer.feed(self._bus.read_all())
+        json_pkt = self.__frame_buffer.next_frame()
+        if json_pkt is None:
             return None
-        json_pkt = self.__json_buffer[: idx + 1].decode("utf8")
-        self.__json_buffer = self.__json_buffer[idx + 1 :]
+        json_pkt = json_pkt.decode("utf8")
         if self.verbose or verbose:
             print(f"recv: {json_pkt}")
         return json_pkt
 
-    @ConnTask.wait
+    def recv_many(self, verbose=False) -> List[str]:
+        """Read serial messages and return every complete packet at once
+
+        A trailing partial packet stays buffered for the next call.
+
+        :return: List[str]
+        """
+        self.__frame_buffer.feed(self._bus.read_all())
+        json_pkts = [
+            json_pkt.decode("utf8") for json_pkt in self.__frame_buffer.frames()
+        ]
+        if self.verbose or verbose:
+            for json_pkt in json_pkts:
+                print(f"recv: {json_pkt}")
+        return json_pkts
+
     def send(self, pkt: str, verbose=False) -> None:
-        """Send json pkt
+        """Queue json pkt, the paced writer keeps 40 ms between packets
 
         :param pkt: Json pkt to send
         :type pkt: str
@@ -150,7 +268,9 @@ class SerTask(ConnTask):
         :type verbose: bool
         :return: None
         """
-        self._bus.write(pkt.encode("utf8"))
+        if self.__writer is None:
+            self.__writer = PacedWriter(self._bus.write)
+        self.__writer.send(pkt.encode("utf8"))
         if self.verbose or verbose:
             print(f"send: {pkt}")
 
@@ -173,26 +293,7 @@ def list_modi_ports() -> List[ListPortInfo]:
 
     :return: List[ListPortInfo]
     """
-
-    def __is_modi_port(port):
-        return (
-            (port.manufacturer and port.manufacturer.upper() == "LUXROBO")
-            or port.product
-            in (
-                "MODI Network Module",
-                "MODI Network Module(BootLoader)",
-                "STM32 Virtual ComPort",
-                "STMicroelectronics Virtual COM Port",
-            )
-            or (port.vid == 0x2FDE and port.pid == 0x1)
-            or (port.vid == 0x2FDE and port.pid == 0x2)
-            or (port.vid == 0x2FDE and port.pid == 0x3)
-            or (port.vid == 0x2FDE and port.pid == 0x4)
-            or (port.vid == 0x483 and port.pid == 0x5740)
-        )
-    modi_ports = [port for port in stl.comports() if __is_modi_port(port)]
-    # print(f'{len(modi_ports)} number of network module(s) exist(s)')
-    return modi_ports
+    return get_device_index().ports()
 
 
 def is_on_pi() -> bool:
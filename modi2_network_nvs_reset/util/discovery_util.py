@@ -0,0 +1,203 @@
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import serial.tools.list_ports as stl
+from serial.tools.list_ports_common import ListPortInfo
+
+NETWORK_MODULE_VID = 0x2FDE
+NETWORK_MODULE_PID = 0x0003
+
+# Not exported by the socket module
+NETLINK_KOBJECT_UEVENT = 15
+
+
+def is_modi_port(port: ListPortInfo) -> bool:
+    """Returns whether a serial port belongs to a MODI device
+
+    :param port: Port information from serial.tools.list_ports
+    :type port: ListPortInfo
+    :return: bool
+    """
+    return (
+        (port.manufacturer and port.manufacturer.upper() == "LUXROBO")
+        or port.product
+        in (
+            "MODI Network Module",
+            "MODI Network Module(BootLoader)",
+            "STM32 Virtual ComPort",
+            "STMicroelectronics Virtual COM Port",
+        )
+        or (port.vid == 0x2FDE and port.pid in (0x1, 0x2, 0x3, 0x4))
+        or (port.vid == 0x483 and port.pid == 0x5740)
+    )
+
+
+def is_network_module_port(port: ListPortInfo) -> bool:
+    return port.vid == NETWORK_MODULE_VID and port.pid == NETWORK_MODULE_PID
+
+
+class ModiDeviceIndex:
+    """Index of attached MODI serial devices, keyed by vid/pid/serial/location
+
+    The ports are enumerated once. On Linux the index is then kept current
+    from kernel uevents on a netlink socket, adding or dropping single tty
+    devices as they come and go, so a lookup never enumerates the bus.
+    A bound socket is no promise of uevents (containers often get none), so
+    the watching thread also rebuilds the index whenever no uevent arrived
+    for watch_refresh_interval. When uevents are unavailable (other platforms, restricted
+    sandboxes) the index is rebuilt at most once per refresh_interval.
+    WinUSB paths have no change events and always follow the refresh
+    interval.
+    """
+
+    def __init__(self, refresh_interval: float = 1.0,
+                 watch_refresh_interval: float = 5.0):
+        self.refresh_interval = refresh_interval
+        self.watch_refresh_interval = watch_refresh_interval
+        self.devices: Dict[Tuple, ListPortInfo] = dict()
+        self.winusb_paths: List[str] = []
+        self.is_watching = False
+        self.__lock = threading.Lock()
+        self.__refresh_time = None
+        self.__winusb_refresh_time = None
+        self.__watch_socket = None
+
+    @staticmethod
+    def key(port: ListPortInfo) -> Tuple:
+        return port.vid, port.pid, port.serial_number, port.location
+
+    def ports(self) -> List[ListPortInfo]:
+        """Returns every indexed MODI port
+
+        :return: List[ListPortInfo]
+        """
+        if not self.is_watching and self.__is_stale(self.__refresh_time, self.refresh_interval):
+            self.refresh()
+        return list(self.devices.values())
+
+    def network_module_ports(self) -> List[str]:
+        """Returns the devices of every network module, WinUSB paths included
+
+        :return: List[str]
+        """
+        port_list = [
+            port.device for port in self.ports() if is_network_module_port(port)
+        ]
+        if sys.platform.startswith("win"):
+            port_list.extend(self.list_winusb_paths())
+        return port_list
+
+    def list_winusb_paths(self) -> List[str]:
+        if self.__is_stale(self.__winusb_refresh_time, self.refresh_interval):
+            from modi2_network_nvs_reset.util.modi_winusb.modi_winusb import list_modi_winusb_paths
+            self.winusb_paths = list_modi_winusb_paths()
+            self.__winusb_refresh_time = time.monotonic()
+        return list(self.winusb_paths)
+
+    def refresh(self) -> None:
+        """Enumerate every serial port and rebuild the index"""
+        # Enumerated under the lock so a uevent handled meanwhile is not
+        # overwritten, lookups read self.devices without it
+        with self.__lock:
+            self.devices = {
+                self.key(port): port for port in stl.comports() if is_modi_port(port)
+            }
+            self.__refresh_time = time.monotonic()
+
+    def start(self) -> bool:
+        """Build the index and follow uevents if the platform has them
+
+        :return: true if the index is kept current from uevents
+        :rtype: bool
+        """
+        if self.is_watching:
+            return True
+        self.refresh()
+        if not sys.platform.startswith("linux"):
+            return False
+        try:
+            watch_socket = socket.socket(
+                socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT
+            )
+            watch_socket.bind((0, 1))
+            watch_socket.settimeout(self.watch_refresh_interval)
+        except (AttributeError, OSError):
+            return False
+        self.__watch_socket = watch_socket
+        self.is_watching = True
+        threading.Thread(target=self.__watch, daemon=True).start()
+        # Catch anything plugged in while the socket was being set up
+        self.refresh()
+        return True
+
+    def stop(self) -> None:
+        self.is_watching = False
+        if self.__watch_socket is not None:
+            self.__watch_socket.close()
+            self.__watch_socket = None
+
+    @staticmethod
+    def __is_stale(refresh_time: Optional[float], interval: float) -> bool:
+        return refresh_time is None or time.monotonic() - refresh_time > interval
+
+    def __watch(self) -> None:
+        watch_socket = self.__watch_socket
+        while self.is_watching:
+            try:
+                message = watch_socket.recv(8192)
+            except socket.timeout:
+                self.refresh()
+                continue
+            except OSError:
+                break
+            fields = dict(
+                field.split("=", 1)
+                for field in message.decode("utf8", "replace").split("\0")
+                if "=" in field
+            )
+            if fields.get("SUBSYSTEM") != "tty" or "DEVNAME" not in fields:
+                continue
+            device = "/dev/" + fields["DEVNAME"].rsplit("/", 1)[-1]
+            action = fields.get("ACTION")
+            if action == "add":
+                self.__add(device)
+            elif action == "remove":
+                self.__remove(device)
+        self.is_watching = False
+
+    def __add(self, device: str) -> None:
+        from serial.tools.list_ports_linux import SysFS
+        port = SysFS(device)
+        if port.subsystem == "platform" or not is_modi_port(port):
+            return
+        with self.__lock:
+            devices = dict(self.devices)
+            devices[self.key(port)] = port
+            self.devices = devices
+
+    def __remove(self, device: str) -> None:
+        with self.__lock:
+            self.devices = {
+                key: port for key, port in self.devices.items()
+                if port.device != device
+            }
+
+
+_device_index = None
+_device_index_lock = threading.Lock()
+
+
+def get_device_index() -> ModiDeviceIndex:
+    """Returns the process wide device index, starting it on first use
+
+    :return: ModiDeviceIndex
+    """
+    global _device_index
+    with _device_index_lock:
+        if _device_index is None:
+            _device_index = ModiDeviceIndex()
+            _device_index.start()
+    return _device_index
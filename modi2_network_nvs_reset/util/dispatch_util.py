@@ -0,0 +1,147 @@
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Commands are one byte and module ids twelve bits on the MODI+ bus
+COMMAND_COUNT = 0x100
+SOURCE_COUNT = 0x1000
+
+
+class Dispatcher:
+    """Dispatch table from command code to handler
+
+    A handler is called as handler(frame, *args) with the decoded Frame.
+    Every frame is counted per command and per source, in frames and in
+    bytes, in flat integer arrays indexed by the code itself, so counting
+    costs a few array stores and no dictionary or object allocation.
+    Frames with no handler are passed to default_handler, if any, and are
+    counted as unhandled rather than dropped silently.
+    """
+
+    def __init__(self, default_handler: Optional[Callable] = None):
+        self.handlers: Dict[int, Callable] = dict()
+        self.default_handler = default_handler
+        self.command_frames = array("Q", bytes(8 * COMMAND_COUNT))
+        self.command_bytes = array("Q", bytes(8 * COMMAND_COUNT))
+        self.source_frames = array("Q", bytes(8 * SOURCE_COUNT))
+        self.source_bytes = array("Q", bytes(8 * SOURCE_COUNT))
+        self.unhandled_count = 0
+
+    def register(self, command: int, handler: Callable) -> Optional[Callable]:
+        """Route frames of a command to handler
+
+        :param command: Command code
+        :param handler: Called as handler(frame, *args)
+        :return: The handler it replaces, None if there was none
+        """
+        previous = self.handlers.get(command)
+        self.handlers[command] = handler
+        return previous
+
+    def unregister(self, command: int) -> Optional[Callable]:
+        return self.handlers.pop(command, None)
+
+    def dispatch(self, frame, size: int, *args) -> bool:
+        """Count the frame and call the handler of its command
+
+        :param frame: Decoded Frame
+        :param size: Encoded size of the frame in bytes
+        :return: true if a handler took the frame
+        :rtype: bool
+        """
+        command = frame.command & 0xFF
+        source = frame.source & 0xFFF
+        self.command_frames[command] += 1
+        self.command_bytes[command] += size
+        self.source_frames[source] += 1
+        self.source_bytes[source] += size
+
+        handler = self.handlers.get(frame.command)
+        if handler is not None:
+            handler(frame, *args)
+            return True
+        self.unhandled_count += 1
+        if self.default_handler is not None:
+            self.default_handler(frame, *args)
+        return False
+
+    def reset_counters(self) -> None:
+        for counters in (
+            self.command_frames, self.command_bytes,
+            self.source_frames, self.source_bytes,
+        ):
+            counters[:] = array("Q", bytes(8 * len(counters)))
+        self.unhandled_count = 0
+
+    def top_commands(self, count: int = 5) -> List[Tuple[int, int, int]]:
+        """Returns the commands with the most traffic as (command, frames, bytes)
+
+        :return: List[Tuple[int, int, int]]
+        """
+        return self.__top(self.command_frames, self.command_bytes, count)
+
+    def top_sources(self, count: int = 5) -> List[Tuple[int, int, int]]:
+        """Returns the sources with the most traffic as (source, frames, bytes)
+
+        :return: List[Tuple[int, int, int]]
+        """
+        return self.__top(self.source_frames, self.source_bytes, count)
+
+    def stats(self) -> dict:
+        return {
+            "frames": sum(self.command_frames),
+            "bytes": sum(self.command_bytes),
+            "unhandled": self.unhandled_count,
+            "commands": {
+                hex(command): {"frames": frames, "bytes": size}
+                for command, frames, size in self.top_commands(COMMAND_COUNT)
+            },
+            "sources": {
+                source: {"frames": frames, "bytes": size}
+                for source, frames, size in self.top_sources(SOURCE_COUNT)
+            },
+        }
+
+    @staticmethod
+    def __top(frame_counts, byte_counts, count):
+        busiest = sorted(
+            (code for code, frames in enumerate(frame_counts) if frames),
+            key=byte_counts.__getitem__, reverse=True,
+        )
+        return [(code, frame_counts[code], byte_counts[code]) for code in busiest[:count]]
+
+
+class SourceRateLimiter:
+    """Allows one action per source id per min_interval seconds
+
+    The last allowed time of every source lives in a flat array('d'), so a
+    check is one load and one compare. Refused actions are counted in
+    suppressed_count.
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.allowed_count = 0
+        self.suppressed_count = 0
+        self.__last_times = array("d", [float("-inf")]) * SOURCE_COUNT
+
+    def allow(self, source: int, now: float) -> bool:
+        """Returns whether source may act at now, recording it if so
+
+        :param source: Module id
+        :param now: Current time.perf_counter()
+        :rtype: bool
+        """
+        source &= 0xFFF
+        if now - self.__last_times[source] < self.min_interval:
+            self.suppressed_count += 1
+            return False
+        self.__last_times[source] = now
+        self.allowed_count += 1
+        return True
+
+    def forget(self, source: Optional[int] = None) -> None:
+        """Let the next action of source, or of every source, through"""
+        if source is None:
+            self.__last_times = array("d", [float("-inf")]) * SOURCE_COUNT
+        else:
+            self.__last_times[source & 0xFFF] = float("-inf")
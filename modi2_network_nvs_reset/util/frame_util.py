@@ -0,0 +1,149 @@
+from typing import Dict, Iterator, List, Optional
+
+# Longest frame the modules send is well under this, anything longer is noise
+MAX_FRAME_SIZE = 256
+
+class FrameBuffer:
+    """Receive buffer which splits a serial byte stream into json frames
+
+    Bytes are appended in whatever chunk size the port delivers and every
+    complete ``{...}`` frame is handed out at once, so the reader never
+    touches the stream one byte at a time. Consumed bytes are tracked with
+    a read offset and only compacted away once they make up half of the
+    buffer, so taking frames one by one does not copy the remainder.
+
+    A damaged stream never raises. A ``{`` inside a frame means the bytes
+    before it were a frame that lost its end, so the scan resyncs on the
+    last ``{`` before the ``}``. A frame longer than max_frame_size is
+    dropped, and so is a partial frame still waiting for its end, up to
+    its last ``{``. Each frame or run dropped is counted once in
+    error_counts by kind, together with any error reported by the decoder
+    through count_error().
+    """
+
+    def __init__(self, max_frame_size: int = MAX_FRAME_SIZE):
+        self._buffer = bytearray()
+        self._offset = 0
+        self.max_frame_size = max_frame_size
+        self.frame_count = 0
+        self.byte_count = 0
+        self.error_counts: Dict[str, int] = {"truncated": 0, "oversize": 0}
+
+    def __len__(self):
+        return len(self._buffer) - self._offset
+
+    def __iter__(self) -> Iterator[bytes]:
+        frame = self.next_frame()
+        while frame is not None:
+            yield frame
+            frame = self.next_frame()
+
+    def feed(self, data: bytes) -> None:
+        """Append received bytes to the buffer
+
+        :param data: Bytes read from the port
+        :type data: bytes
+        :return: None
+        """
+        self._buffer += data
+        self.byte_count += len(data)
+
+    def next_frame(self) -> Optional[bytes]:
+        """Return the next complete frame, None if there is none yet
+
+        :return: Optional[bytes]
+        """
+        begin, end = self.__scan(self._offset)
+        if end < 0:
+            self.__consume(begin)
+            return None
+        frame = bytes(self._buffer[begin : end + 1])
+        self.__consume(end + 1)
+        self.frame_count += 1
+        return frame
+
+    def frames(self) -> List[bytes]:
+        """Return every complete frame in the buffer
+
+        Bytes in front of a frame are discarded and a trailing partial frame
+        is kept for the next call.
+
+        :return: List[bytes]
+        """
+        buffer = self._buffer
+        find = buffer.find
+        max_frame_size = self.max_frame_size
+        frames = []
+        pos = self._offset
+        with memoryview(buffer) as view:
+            while True:
+                begin = find(b"{", pos)
+                if begin < 0:
+                    pos = len(buffer)
+                    break
+                end = find(b"}", begin + 1)
+                # Anything but a well formed frame takes the slow path
+                if (
+                    end < 0 or end - begin >= max_frame_size
+                    or find(b"{", begin + 1, end) >= 0
+                ):
+                    begin, end = self.__scan(begin)
+                    if end < 0:
+                        pos = begin
+                        break
+                frames.append(bytes(view[begin : end + 1]))
+                pos = end + 1
+        self.__consume(pos)
+        self.frame_count += len(frames)
+        return frames
+
+    def count_error(self, kind: str) -> None:
+        """Count a frame rejected after framing, e.g. by the decoder"""
+        self.error_counts[kind] = self.error_counts.get(kind, 0) + 1
+
+    def clear(self) -> None:
+        del self._buffer[:]
+        self._offset = 0
+
+    def __consume(self, pos: int) -> None:
+        if pos >= len(self._buffer):
+            self.clear()
+        elif pos > len(self._buffer) >> 1:
+            del self._buffer[:pos]
+            self._offset = 0
+        else:
+            self._offset = pos
+
+    def __scan(self, pos: int):
+        """Returns (begin, end) of the next frame from pos
+
+        end is -1 when there is no complete frame, bytes before begin can
+        then be dropped.
+        """
+        buffer = self._buffer
+        find = buffer.find
+        max_frame_size = self.max_frame_size
+        while True:
+            begin = find(b"{", pos)
+            if begin < 0:
+                return len(buffer), -1
+            end = find(b"}", begin + 1)
+            if end < 0:
+                if len(buffer) - begin <= max_frame_size:
+                    return begin, -1
+                # A partial frame this long will never be valid, nor will any
+                # before the last brace, so the whole run goes as one error
+                self.error_counts["oversize"] += 1
+                last = buffer.rfind(b"{", begin)
+                if len(buffer) - last <= max_frame_size:
+                    return last, -1
+                return len(buffer), -1
+            if find(b"{", begin + 1, end) >= 0:
+                # The frame before the inner brace lost its end
+                self.error_counts["truncated"] += 1
+                begin = buffer.rfind(b"{", begin + 1, end)
+            if end - begin >= max_frame_size:
+                self.error_counts["oversize"] += 1
+                pos = end + 1
+                continue
+            return begin, end
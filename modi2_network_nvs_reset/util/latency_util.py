@@ -0,0 +1,187 @@
+import atexit
+import json
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from modi2_network_nvs_reset.util.retry_util import RetryPolicy
+
+DEFAULT_LATENCY_PATH = os.path.join(
+    os.path.expanduser("~"), ".modi2_network_nvs_reset", "reset_latency.json"
+)
+
+
+def percentile(samples, fraction: float) -> float:
+    """Returns the nearest-rank percentile of samples
+
+    :param samples: Non empty collection of numbers
+    :param fraction: Percentile as a fraction, 0.99 for p99
+    :return: float
+    """
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class LatencyModel:
+    """Rolling reset completion latency per firmware version
+
+    Keeps the last window samples of the time from the first reset command
+    to the completion frame for each firmware version, and derives a
+    RetryPolicy from their p50/p99. A reset whose first command was lost
+    is measured from that command too, so its sample is an outlier; the
+    p99 used for the schedule is capped at outlier_factor times the p50 so
+    a few of those do not stretch it. The samples are persisted as json so
+    a fresh start uses what earlier runs learned.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_LATENCY_PATH,
+                 window: int = 200, min_samples: int = 5,
+                 outlier_factor: float = 4.0):
+        self.path = path
+        self.window = window
+        self.min_samples = min_samples
+        self.outlier_factor = outlier_factor
+        self.samples: Dict[str, deque] = dict()
+        self.is_dirty = False
+        self.__lock = threading.Lock()
+
+    def record(self, version: str, latency: float) -> None:
+        """Add the completion latency of one reset
+
+        :param version: Firmware version of the network module
+        :param latency: Seconds from the first reset command to completion
+        """
+        with self.__lock:
+            samples = self.samples.get(version)
+            if samples is None:
+                samples = self.samples[version] = deque(maxlen=self.window)
+            samples.append(latency)
+            self.is_dirty = True
+
+    def estimate(self, version: str) -> Optional[Dict[str, float]]:
+        """Returns the p50 and p99 latency of a version, None until min_samples
+
+        :return: Optional[Dict[str, float]]
+        """
+        with self.__lock:
+            samples = list(self.samples.get(version, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return {
+            "count": len(samples),
+            "p50": percentile(samples, 0.5),
+            "p99": percentile(samples, 0.99),
+        }
+
+    def retry_policy(self, version: str, base: RetryPolicy) -> RetryPolicy:
+        """Returns base with its schedule fitted to the latency of a version
+
+        The first resend comes just after the p99, when a reply that has
+        not arrived was most likely lost, later than the base max_delay for
+        a version slower than that. The deadline leaves room for a few p99
+        waits but never drops below the base deadline, so a slow unit is
+        never timed out earlier than it used to be.
+
+        :param version: Firmware version of the network module
+        :param base: Policy used when the version has too few samples
+        :return: RetryPolicy
+        """
+        estimate = self.estimate(version)
+        if estimate is None:
+            return base
+        p50 = estimate["p50"]
+        p99 = min(estimate["p99"], p50 * self.outlier_factor)
+        first_delay = max(p99 * 1.5, p50 * 2, 0.05)
+        deadline = base.deadline
+        if deadline is not None:
+            deadline = max(deadline, p99 * 4)
+        return RetryPolicy(
+            first_delay=first_delay,
+            backoff=base.backoff,
+            max_delay=max(base.max_delay, first_delay),
+            jitter=base.jitter,
+            deadline=deadline,
+            max_retries=base.max_retries,
+        )
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.__lock:
+            versions = list(self.samples)
+        return {
+            version: estimate for version, estimate in
+            ((version, self.estimate(version)) for version in versions)
+            if estimate is not None
+        }
+
+    def load(self) -> bool:
+        """Read the samples persisted by an earlier run
+
+        :return: true if a summary was read
+        :rtype: bool
+        """
+        if self.path is None:
+            return False
+        try:
+            with open(self.path, "r") as summary_file:
+                summary = json.load(summary_file)
+            versions = summary["versions"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        with self.__lock:
+            for version, entry in versions.items():
+                self.samples[version] = deque(
+                    (float(latency) for latency in entry.get("samples", ())),
+                    maxlen=self.window,
+                )
+        return True
+
+    def save(self) -> bool:
+        """Write the samples and their p50/p99 if anything was recorded
+
+        :return: true if the file was written
+        :rtype: bool
+        """
+        if self.path is None or not self.is_dirty:
+            return False
+        with self.__lock:
+            samples = {version: list(latency) for version, latency in self.samples.items()}
+            self.is_dirty = False
+        estimates = self.summary()
+        summary = {
+            "versions": {
+                version: dict(estimates.get(version, {}), samples=latency)
+                for version, latency in samples.items()
+            }
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as summary_file:
+                json.dump(summary, summary_file, indent=1)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Failed to save reset latency: {e!r}")
+            return False
+        return True
+
+
+_latency_model = None
+_latency_model_lock = threading.Lock()
+
+
+def get_latency_model() -> LatencyModel:
+    """Returns the process wide latency model, loaded on first use
+
+    The model is saved again when the process exits.
+
+    :return: LatencyModel
+    """
+    global _latency_model
+    with _latency_model_lock:
+        if _latency_model is None:
+            _latency_model = LatencyModel()
+            _latency_model.load()
+            atexit.register(_latency_model.save)
+    return _latency_model
@@ -1,6 +1,8 @@
 import json
+import re
 from base64 import b64decode, b64encode
-from typing import Tuple
+from binascii import a2b_base64
+from typing import NamedTuple, Optional, Tuple
 
 
 def parse_message(
@@ -51,6 +53,76 @@ def __encode_bytes(byte_data: Tuple):
     return b64encode(bytes(data)).decode("utf8")
 
 
+def encode_message(
+    command: int,
+    source: int,
+    destination: int,
+    byte_data: Tuple = (None, None, None, None, None, None, None, None),
+) -> bytes:
+    """Encode a message straight to the bytes written on the wire
+
+    Produces the same frame as parse_message(...).encode("utf8") without
+    building a dict or going through json.dumps.
+
+    :return: bytes
+    """
+    if isinstance(byte_data, (bytes, bytearray)):
+        payload = bytes(byte_data)
+    else:
+        try:
+            payload = bytes(value or 0 for value in byte_data)
+        except (ValueError, TypeError):
+            # Multi-byte or negative values need the general encoder
+            return _MESSAGE_FORMAT % (
+                command, source, destination,
+                __encode_bytes(byte_data).encode("utf8"), len(byte_data),
+            )
+    return _MESSAGE_FORMAT % (
+        command, source, destination, b64encode(payload), len(payload)
+    )
+
+
+_MESSAGE_FORMAT = b'{"c":%d,"s":%d,"d":%d,"b":"%s","l":%d}'
+
+
+class MessageTemplate:
+    """Pre-encoded message of which only the destination id changes
+
+    The frame is split around the destination once, and every encoded
+    destination is cached, so sending it again is a dictionary lookup.
+    """
+
+    def __init__(self, command: int, source: int, byte_data: bytes):
+        self._prefix = b'{"c":%d,"s":%d,"d":' % (command, source)
+        self._suffix = b',"b":"%s","l":%d}' % (
+            b64encode(bytes(byte_data)), len(byte_data)
+        )
+        self._frames = dict()
+
+    def encode(self, destination: int) -> bytes:
+        """Return the frame addressed to destination
+
+        :param destination: Id of the destination module
+        :type destination: int
+        :return: bytes
+        """
+        frame = self._frames.get(destination)
+        if frame is None:
+            frame = self._prefix + b"%d" % destination + self._suffix
+            self._frames[destination] = frame
+        return frame
+
+
+# Network module reset, sent by the reset tool
+RESET_MESSAGE = MessageTemplate(0x04, 30, bytes(1))
+# Ask the modules to announce themselves with an assign-id message
+REQUEST_UUID_MESSAGE = MessageTemplate(0x28, 0x0, bytes((0xFF, 0x0F)))
+# Reply to a module health message
+HEALTH_REPLY_MESSAGE = MessageTemplate(
+    0x28, 0x0, int.to_bytes(0xFFF, byteorder="little", length=8)
+)
+
+
 def decode_message(message: str):
     message = json.loads(message)
     command = message["c"]
@@ -61,6 +133,61 @@ def decode_message(message: str):
     return command, source, destination, data, length
 
 
+class Frame(NamedTuple):
+    command: int
+    source: int
+    destination: int
+    data: bytes
+    length: int
+
+
+_FRAME_PATTERN = re.compile(
+    rb'\{"c":(\d+),"s":(\d+),"d":(\d+),"b":"([A-Za-z0-9+/=]*)","l":(\d+)\}'
+)
+
+
+def decode_frame(frame) -> Frame:
+    """Decode a received frame into a Frame with its payload already unpacked
+
+    Frames in the fixed {"c":..,"s":..,"d":..,"b":"..","l":..} layout the
+    modules send are matched by one compiled pattern; anything else goes
+    through json.loads.
+
+    :param frame: bytes, bytearray or str of one complete frame
+    :return: Frame
+    """
+    if isinstance(frame, str):
+        frame = frame.encode("utf8")
+    match = _FRAME_PATTERN.fullmatch(frame)
+    if match is None:
+        message = json.loads(frame)
+        return Frame(
+            message["c"], message["s"], message["d"],
+            b64decode(message["b"]), message["l"],
+        )
+    command, source, destination, data, length = match.groups()
+    return Frame(
+        int(command), int(source), int(destination),
+        a2b_base64(data), int(length),
+    )
+
+
+def try_decode_frame(frame) -> Optional[Frame]:
+    """Decode a frame like decode_frame, returning None if it cannot be decoded
+
+    A payload which is not as long as its l field says is still returned,
+    modules have been seen to send such frames, so callers compare
+    frame.length with len(frame.data) to count them.
+
+    :param frame: bytes, bytearray or str of one complete frame
+    :return: Optional[Frame]
+    """
+    try:
+        return decode_frame(frame)
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
 def unpack_data(data: str, structure: Tuple = (1, 1, 1, 1, 1, 1, 1, 1)):
     data = bytearray(b64decode(data.encode("utf8")))
     idx = 0
@@ -1,24 +1,11 @@
 import sys
 import time
 import serial
-import serial.tools.list_ports as stl
 
-def list_modi_serialports():
-    info_list = []
-
-    def __is_modi_port(port):
-        return (port.vid == 0x2FDE and port.pid == 0x0003)
-    modi_ports = [port for port in stl.comports() if __is_modi_port(port)]
-    for modi_port in modi_ports:
-        info_list.append(modi_port.device)
+from modi2_network_nvs_reset.util.discovery_util import get_device_index
 
-    if sys.platform.startswith("win"):
-        from modi2_multi_uploader.util.modi_winusb.modi_winusb import list_modi_winusb_paths
-        path_list = list_modi_winusb_paths()
-        for index, value in enumerate(path_list):
-            info_list.append(value)
-
-    return info_list
+def list_modi_serialports():
+    return get_device_index().network_module_ports()
 
 class ModiSerialPort():
     SERIAL_MODE_COMPORT = 1
@@ -41,8 +28,8 @@ class ModiSerialPort():
         self._port = port
 
         if sys.platform.startswith("win"):
-            from modi2_multi_uploader.util.modi_winusb.modi_winusb import ModiWinUsbComPort, list_modi_winusb_paths
-            if port in list_modi_winusb_paths():
+            from modi2_network_nvs_reset.util.modi_winusb.modi_winusb import ModiWinUsbComPort
+            if port in get_device_index().list_winusb_paths():
                 self.type = self.SERIAL_MODI_WINUSB
                 winusb = ModiWinUsbComPort(path = self._port, baudrate=self._baudrate, timeout=self._timeout)
                 self.serial_port = winusb
@@ -0,0 +1,116 @@
+"""MODI+ protocol constants and the module type registry
+
+Every lookup table is built once at import time so classifying a message
+is a single dictionary access.
+"""
+
+BROADCAST_ID = 0xFFF
+
+# Commands
+HEALTH = 0x00
+RESET = 0x04
+ASSIGN_ID = 0x05
+WARNING = 0x0A
+REQUEST_UUID = 0x28
+VERSION = 0xA1
+
+# Source id of the esp32 on the network module
+ESP32_ID = 9
+
+MODULE_TYPES = {
+    # Setup modules
+    0x0000: "network",
+    0x0010: "battery",
+    # Input modules
+    0x2000: "env",
+    0x2010: "gyro",
+    0x2020: "mic",
+    0x2030: "button",
+    0x2040: "dial",
+    0x2050: "ultrasonic",
+    0x2060: "ir",
+    0x2070: "joystick",
+    0x2080: "tof",
+    # Output modules
+    0x4000: "display",
+    0x4010: "motor_a",
+    0x4011: "motor_b",
+    0x4020: "led",
+    0x4030: "speaker",
+}
+
+MODULE_TYPE_CODES = {name: code for code, name in MODULE_TYPES.items()}
+
+# Capitalised names the reset manager has always reported, types added to
+# the registry later have none and stay "none" there
+LEGACY_MODULE_NAMES = {
+    "network": "Network",
+    "battery": "Battery",
+    "env": "Env",
+    "gyro": "Gyro",
+    "button": "Button",
+    "dial": "Dial",
+    "joystick": "Joystick",
+    "tof": "ToF",
+    "display": "Display",
+    "motor_a": "MotorA",
+    "motor_b": "MotorB",
+    "led": "Led",
+    "speaker": "Speaker",
+}
+
+LEGACY_MODULE_TYPES = {
+    code: LEGACY_MODULE_NAMES[name] for code, name in MODULE_TYPES.items()
+    if name in LEGACY_MODULE_NAMES
+}
+
+LEGACY_MODULE_TYPE_CODES = {name: code for code, name in LEGACY_MODULE_TYPES.items()}
+
+
+def get_type_code(uuid: int) -> int:
+    """Returns the 16 bit module type code embedded in a uuid
+
+    :param uuid: 48 bit module uuid
+    :type uuid: int
+    :return: int
+    """
+    return (uuid >> 32) & 0xFFFF
+
+
+def uuid_to_module_type(uuid: int, default=None):
+    """Returns the module type name of a uuid
+
+    :param uuid: 48 bit module uuid
+    :type uuid: int
+    :param default: Returned for an unknown type code
+    :return: str
+    """
+    return MODULE_TYPES.get((uuid >> 32) & 0xFFFF, default)
+
+
+def module_type_to_code(module_type: str, default=None):
+    """Returns the type code of a module type name
+
+    :param module_type: Module type name, e.g. "network"
+    :type module_type: str
+    :param default: Returned for an unknown name
+    :return: int
+    """
+    return MODULE_TYPE_CODES.get(module_type, default)
+
+
+def is_network_uuid(uuid: int) -> bool:
+    return (uuid >> 32) & 0xFFFF == 0x0000
+
+
+def version_to_string(version: int) -> str:
+    """Returns the major.minor.patch form of a 16 bit firmware version
+
+    The version is packed as major << 13 | minor << 8 | patch, the layout
+    of the last two bytes of an assign-id message.
+
+    :param version: Packed firmware version
+    :type version: int
+    :return: str
+    """
+    return f"{version >> 13}.{(version >> 8) & 0x1F}.{version & 0xFF}"
@@ -0,0 +1,138 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from modi2_network_nvs_reset.util.capture_util import IN, read_capture, read_port_names
+
+
+class ReplaySerial:
+    """Serial port which plays back the inbound side of a capture
+
+    Offers the read, read_all, in_waiting, write and close subset of
+    serial.Serial used by the reset core and SerTask, so a recorded bus
+    can drive Network_reset_manager (pass it as ser) or SerTask (assign it
+    to _bus) with no device attached. chunks holds the (timestamp_ns, data)
+    of every inbound chunk in order, from_capture() reads them from a file.
+
+    In real time mode a chunk becomes readable once as much time has passed
+    since the replay started as had passed in the capture, scaled by speed.
+    Otherwise chunks are handed out as fast as they are read, one captured
+    chunk at a time so the reader sees the original chunking. Writes are
+    kept in written. exhausted is set once every chunk has been read.
+    """
+
+    def __init__(self, chunks: List[Tuple[int, bytes]], port: str = "replay",
+                 realtime: bool = False, speed: float = 1.0, timeout: float = 0.1):
+        self.port = port
+        self.realtime = realtime
+        self.speed = speed
+        self.timeout = timeout
+        self.is_open = True
+        self.written: List[bytes] = []
+        self.exhausted = threading.Event()
+        self.__chunks = chunks
+        self.__index = 0
+        self.__buffer = bytearray()
+        self.__first_timestamp = chunks[0][0] if chunks else 0
+        self.__start = time.perf_counter()
+        if not chunks:
+            self.exhausted.set()
+
+    @classmethod
+    def from_capture(cls, path: str, port: Optional[str] = None, **kwargs):
+        """Replay the chunks read from one port of a capture
+
+        :param path: File written by capture_util.CaptureWriter
+        :param port: Device name of the port, the first one if None
+        :return: ReplaySerial
+        """
+        port_names = read_port_names(path)
+        if port is None:
+            port_index = min(port_names, default=0)
+            port = port_names.get(port_index, "replay")
+        else:
+            port_indexes = {name: index for index, name in port_names.items()}
+            if port not in port_indexes:
+                raise ValueError(f"{port} is not in {path}")
+            port_index = port_indexes[port]
+        chunks = [
+            (record.timestamp, record.data) for record in read_capture(path)
+            if record.direction == IN and record.port == port_index
+        ]
+        return cls(chunks, port=port, **kwargs)
+
+    @property
+    def in_waiting(self) -> int:
+        self.__release()
+        return len(self.__buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        """Read up to size bytes, waiting up to timeout for the first one"""
+        self.__release()
+        if not self.__buffer:
+            self.__wait()
+        data = bytes(self.__buffer[:size])
+        del self.__buffer[:size]
+        self.__check_exhausted()
+        return data
+
+    def read_all(self) -> bytes:
+        self.__release()
+        data = bytes(self.__buffer)
+        self.__buffer.clear()
+        self.__check_exhausted()
+        return data
+
+    def write(self, data: bytes) -> int:
+        self.written.append(bytes(data))
+        return len(data)
+
+    def reset_input_buffer(self) -> None:
+        self.__buffer.clear()
+
+    def flush(self) -> None:
+        pass
+
+    def open(self) -> None:
+        self.is_open = True
+
+    def close(self) -> None:
+        self.is_open = False
+
+    def rewind(self) -> None:
+        """Start the replay over from the first chunk"""
+        self.__index = 0
+        self.__buffer.clear()
+        self.__start = time.perf_counter()
+        self.exhausted.clear()
+        self.__check_exhausted()
+
+    def __due_time(self, index: int) -> float:
+        timestamp = self.__chunks[index][0]
+        return self.__start + (timestamp - self.__first_timestamp) / 1e9 / self.speed
+
+    def __release(self) -> None:
+        chunks = self.__chunks
+        if not self.realtime:
+            if not self.__buffer and self.__index < len(chunks):
+                self.__buffer += chunks[self.__index][1]
+                self.__index += 1
+            return
+        now = time.perf_counter()
+        while self.__index < len(chunks) and self.__due_time(self.__index) <= now:
+            self.__buffer += chunks[self.__index][1]
+            self.__index += 1
+
+    def __wait(self) -> None:
+        # Sleep like a real port with nothing to read, at most timeout
+        timeout = self.timeout if self.timeout is not None else 0.1
+        if self.realtime and self.__index < len(self.__chunks):
+            delay = self.__due_time(self.__index) - time.perf_counter()
+            time.sleep(min(max(delay, 0.0), timeout))
+            self.__release()
+        elif self.__index >= len(self.__chunks):
+            time.sleep(timeout)
+
+    def __check_exhausted(self) -> None:
+        if self.__index >= len(self.__chunks) and not self.__buffer:
+            self.exhausted.set()
@@ -0,0 +1,118 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+
+class PendingRequest(Future):
+    """Future completed by the first inbound frame matching its key
+
+    A source or destination of None matches any id.
+    """
+
+    def __init__(self, command: int, source: Optional[int],
+                 destination: Optional[int], deadline: Optional[float]):
+        super().__init__()
+        self.command = command
+        self.source = source
+        self.destination = destination
+        self.deadline = deadline
+        self.sent_time = time.perf_counter()
+
+    def matches(self, frame) -> bool:
+        return (
+            (self.source is None or self.source == frame.source)
+            and (self.destination is None or self.destination == frame.destination)
+        )
+
+
+class RequestTracker:
+    """Correlates inbound frames with outstanding requests
+
+    Requests are indexed by their expected command, so a frame for which
+    nothing is pending costs one dictionary lookup. Any number of requests
+    to different modules can be outstanding at once, each with its own
+    deadline; expire() fails the overdue ones with TimeoutError.
+    """
+
+    def __init__(self):
+        self.__pending: Dict[int, List[PendingRequest]] = dict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(requests) for requests in self.__pending.values())
+
+    def expect(self, command: int, source: Optional[int] = None,
+               destination: Optional[int] = None,
+               timeout: Optional[float] = None) -> PendingRequest:
+        """Register a request waiting for a (command, source, destination) reply
+
+        :param command: Command of the expected reply
+        :param source: Source id of the reply, any if None
+        :param destination: Destination id of the reply, any if None
+        :param timeout: Seconds until expire() fails the request
+        :return: PendingRequest
+        """
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        request = PendingRequest(command, source, destination, deadline)
+        with self.__lock:
+            self.__pending.setdefault(command, []).append(request)
+        return request
+
+    def resolve(self, frame) -> bool:
+        """Complete the oldest request the frame answers
+
+        :param frame: Decoded Frame
+        :return: true if a request was completed
+        :rtype: bool
+        """
+        requests = self.__pending.get(frame.command)
+        if not requests:
+            return False
+        with self.__lock:
+            for request in requests:
+                if request.matches(frame):
+                    requests.remove(request)
+                    break
+            else:
+                return False
+        if request.set_running_or_notify_cancel():
+            request.set_result(frame)
+        return True
+
+    def expire(self, now: Optional[float] = None) -> Optional[float]:
+        """Fail every overdue request with TimeoutError
+
+        :return: Deadline of the next request to expire, None if there is none
+        :rtype: Optional[float]
+        """
+        now = time.perf_counter() if now is None else now
+        expired = []
+        next_deadline = None
+        with self.__lock:
+            for requests in self.__pending.values():
+                for request in list(requests):
+                    if request.deadline is None:
+                        continue
+                    if request.deadline <= now:
+                        requests.remove(request)
+                        expired.append(request)
+                    elif next_deadline is None or request.deadline < next_deadline:
+                        next_deadline = request.deadline
+        for request in expired:
+            if request.set_running_or_notify_cancel():
+                request.set_exception(TimeoutError(
+                    f"No reply to command {hex(request.command)} "
+                    f"from {request.source}"
+                ))
+        return next_deadline
+
+    def cancel_all(self) -> None:
+        with self.__lock:
+            requests = [
+                request for requests in self.__pending.values()
+                for request in requests
+            ]
+            self.__pending.clear()
+        for request in requests:
+            request.cancel()
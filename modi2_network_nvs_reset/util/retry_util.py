@@ -0,0 +1,127 @@
+import functools
+import random
+import time
+from typing import Optional
+
+
+class RetryPolicy:
+    """Schedule of retries with exponential backoff, jitter and a deadline
+
+    The n-th retry (starting at 0) waits first_delay * backoff ** n seconds,
+    capped at max_delay and spread by +-jitter of itself so a fleet of
+    modules does not retry in lockstep. Nothing is retried past deadline
+    seconds after the start, nor more than max_retries times if given.
+    Without a deadline the schedule ends one wait after the last retry.
+
+    The defaults keep the three resends and eight second timeout the reset
+    always had, but make the first resend after one second instead of two:
+    a module busy resetting is not hit again within its usual completion
+    time, and a lost command is still noticed sooner.
+    """
+
+    def __init__(
+        self,
+        first_delay: float = 1.0,
+        backoff: float = 2.0,
+        max_delay: float = 2.0,
+        jitter: float = 0.1,
+        deadline: Optional[float] = 8.0,
+        max_retries: Optional[int] = 3,
+    ):
+        self.first_delay = first_delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.deadline = deadline
+        self.max_retries = max_retries
+
+    def __repr__(self):
+        return (
+            f"RetryPolicy(first_delay={self.first_delay}, backoff={self.backoff}, "
+            f"max_delay={self.max_delay}, jitter={self.jitter}, "
+            f"deadline={self.deadline}, max_retries={self.max_retries})"
+        )
+
+    def delay(self, retries: int) -> float:
+        """Returns the wait in seconds before retry number retries
+
+        :param retries: Retries done so far
+        :return: float
+        """
+        delay = min(self.first_delay * self.backoff ** retries, self.max_delay)
+        if self.jitter:
+            delay *= 1 + self.jitter * (2 * random.random() - 1)
+        return delay
+
+    def max_elapsed(self) -> Optional[float]:
+        """Returns the longest time the whole schedule can take, None if unbounded
+
+        :return: Optional[float]
+        """
+        if self.deadline is not None:
+            return self.deadline
+        if self.max_retries is None:
+            return None
+        # Every retry plus the wait after the last one, at their longest
+        return sum(
+            min(self.first_delay * self.backoff ** retries, self.max_delay)
+            for retries in range(self.max_retries + 1)
+        ) * (1 + self.jitter)
+
+    def can_retry(self, retries: int) -> bool:
+        return self.max_retries is None or retries < self.max_retries
+
+    def is_over(self, retries: int, start: float, now: float) -> bool:
+        """Returns whether to give up, woken at a time given by next_time()
+
+        True past the deadline, or without one once the retries are used up.
+        """
+        if self.deadline is not None:
+            return now >= start + self.deadline
+        return not self.can_retry(retries)
+
+    def next_time(self, retries: int, start: float, now: float) -> Optional[float]:
+        """Returns when to wake up next, None once the deadline has passed
+
+        The wake up is the next retry, or once the retries are used up the
+        deadline itself, so the last attempt still gets its full wait.
+        Without a deadline that wait is one more delay, see is_over().
+
+        :param retries: Retries done so far
+        :param start: Time the first attempt was made
+        :param now: Current time, on the same clock as start
+        :return: Optional[float]
+        """
+        end = None if self.deadline is None else start + self.deadline
+        if end is not None and now >= end:
+            return None
+        if not self.can_retry(retries) and end is not None:
+            return end
+        wake_time = now + self.delay(retries)
+        return wake_time if end is None else min(wake_time, end)
+
+
+def retry(exception_to_catch, policy: Optional[RetryPolicy] = None):
+    """Retry the decorated function on exception_to_catch following policy
+
+    The last exception is raised again once the policy gives up.
+    """
+    policy = policy or RetryPolicy(jitter=0)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            retries = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except exception_to_catch:
+                    now = time.monotonic()
+                    wake_time = policy.next_time(retries, start, now)
+                    if wake_time is None or not policy.can_retry(retries):
+                        raise
+                    time.sleep(max(0.0, wake_time - now))
+                    retries += 1
+        return wrapper
+    return decorator
@@ -0,0 +1,291 @@
+"""MODI+ modules simulated behind pseudo terminals
+
+Each SimulatedPort is a pty standing in for the USB port of a network
+module, with any number of modules on its chain. Every announce_interval
+each module sends a health (0x00) and an assign-id (0x05) frame, a uuid
+request (0x28) is answered with the assign-id frames right away, and a
+reset (0x04) addressed to the network module is answered with the esp32
+completion frame (0xA1 from id 9) after reset_delay. Frames can be
+dropped or corrupted at random to exercise retries and resynchronisation.
+
+    with ModuleSimulator() as simulator:
+        ports = simulator.add_network_modules(32)
+        Network_reset_fleet_manager(ports=ports).start_reset_thread()
+
+Unix only, one thread serves every port.
+"""
+import heapq
+import itertools
+import os
+import random
+import selectors
+import threading
+import time
+import tty
+from typing import List, Optional, Sequence
+
+from modi2_network_nvs_reset.util.frame_util import FrameBuffer
+from modi2_network_nvs_reset.util.message_util import (encode_message,
+                                                     try_decode_frame)
+from modi2_network_nvs_reset.util.protocol_util import (ASSIGN_ID, BROADCAST_ID,
+                                                      ESP32_ID, HEALTH,
+                                                      REQUEST_UUID, RESET,
+                                                      VERSION, is_network_uuid)
+
+HEALTH_DATA = bytes((0, 0, 0, 0, 35, 0, 0, 0))
+
+
+class SimulatedModule:
+    """One module on a simulated chain"""
+
+    def __init__(self, uuid: int, version: int = 0x4000):
+        self.uuid = uuid
+        self.version = version
+        self.id = uuid & 0xFFF
+        self.health_frame = encode_message(HEALTH, self.id, BROADCAST_ID, HEALTH_DATA)
+        self.assign_frame = encode_message(
+            ASSIGN_ID, self.id, BROADCAST_ID,
+            uuid.to_bytes(6, byteorder="little") + version.to_bytes(2, byteorder="little"),
+        )
+
+    @property
+    def is_network(self) -> bool:
+        return is_network_uuid(self.uuid)
+
+
+class SimulatedPort:
+    """Master side of a pty with a chain of simulated modules behind it"""
+
+    def __init__(self, modules: Sequence[SimulatedModule], reset_delay: float = 0.05,
+                 drop_rate: float = 0.0, corrupt_rate: float = 0.0,
+                 rng: Optional[random.Random] = None):
+        self.modules = list(modules)
+        self.reset_delay = reset_delay
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.rng = rng or random.Random()
+        self.network_ids = {module.id for module in self.modules if module.is_network}
+        self.reset_count = 0
+        self.complete_count = 0
+        self.drop_count = 0
+        self.corrupt_count = 0
+        self.overflow_count = 0
+        self.reset_times = []
+        self.frame_buffer = FrameBuffer()
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.device = os.ttyname(self.slave)
+        self.is_open = True
+
+    def fileno(self) -> int:
+        return self.master
+
+    def announce(self) -> None:
+        self.send(b"".join(
+            module.health_frame + module.assign_frame for module in self.modules
+        ))
+
+    def send(self, data: bytes) -> None:
+        if self.drop_rate and self.rng.random() < self.drop_rate:
+            self.drop_count += 1
+            return
+        if self.corrupt_rate and self.rng.random() < self.corrupt_rate:
+            data = self.__corrupt(data)
+        try:
+            os.write(self.master, data)
+        except BlockingIOError:
+            # Nobody is reading the port, a full buffer loses the frames
+            self.overflow_count += 1
+        except OSError:
+            pass
+
+    def receive(self) -> List[float]:
+        """Read what the host wrote, returns the delays of completions to send
+
+        :return: List[float]
+        """
+        try:
+            data = os.read(self.master, 4096)
+        except (BlockingIOError, OSError):
+            return []
+        self.frame_buffer.feed(data)
+        completions = []
+        for frame in self.frame_buffer.frames():
+            frame = try_decode_frame(frame)
+            if frame is None:
+                continue
+            if frame.command == RESET and frame.destination in self.network_ids:
+                if self.drop_rate and self.rng.random() < self.drop_rate:
+                    self.drop_count += 1
+                    continue
+                self.reset_count += 1
+                self.reset_times.append(time.perf_counter())
+                completions.append(self.reset_delay)
+            elif frame.command == REQUEST_UUID and frame.destination == BROADCAST_ID:
+                self.send(b"".join(module.assign_frame for module in self.modules))
+        return completions
+
+    def complete(self) -> None:
+        self.complete_count += 1
+        self.send(encode_message(VERSION, ESP32_ID, 0, bytes((1, 2))))
+
+    def close(self) -> None:
+        self.is_open = False
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __corrupt(self, data: bytes) -> bytes:
+        self.corrupt_count += 1
+        data = bytearray(data)
+        position = self.rng.randrange(len(data))
+        kind = self.rng.randrange(3)
+        if kind == 0:
+            # Lost closing brace
+            end = data.find(b"}", position)
+            if end >= 0:
+                del data[end]
+        elif kind == 1:
+            # Stray opening brace in the middle of a frame
+            data.insert(position, ord("{"))
+        else:
+            data[position] ^= 0x55
+        return bytes(data)
+
+
+class ModuleSimulator:
+    """Serves many simulated ports from one thread"""
+
+    def __init__(self, announce_interval: float = 0.1, reset_delay: float = 0.05,
+                 drop_rate: float = 0.0, corrupt_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.announce_interval = announce_interval
+        self.reset_delay = reset_delay
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.rng = random.Random(seed)
+        self.simulated_ports: List[SimulatedPort] = []
+        self.running = False
+        self.thread = None
+        self.__uuids = itertools.count(1)
+        self.__selector = selectors.DefaultSelector()
+        self.__timers = []
+        self.__timer_ids = itertools.count()
+        self.__lock = threading.Lock()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_port(self, modules: Optional[Sequence[SimulatedModule]] = None,
+                 **options) -> SimulatedPort:
+        """Add a pty with a chain of modules, one network module if None
+
+        :param modules: Modules on the chain
+        :param options: reset_delay, drop_rate or corrupt_rate of this port
+        :return: SimulatedPort
+        """
+        if modules is None:
+            modules = [self.new_module()]
+        options.setdefault("reset_delay", self.reset_delay)
+        options.setdefault("drop_rate", self.drop_rate)
+        options.setdefault("corrupt_rate", self.corrupt_rate)
+        simulated_port = SimulatedPort(modules, rng=self.rng, **options)
+        with self.__lock:
+            self.simulated_ports.append(simulated_port)
+            self.__selector.register(simulated_port, selectors.EVENT_READ)
+            self.__push(time.perf_counter(), simulated_port.announce, simulated_port)
+        return simulated_port
+
+    def add_network_modules(self, count: int, chain_length: int = 0,
+                            **options) -> List[str]:
+        """Add count ports, each with a network module and chain_length more
+
+        :return: Device names of the new ports
+        :rtype: List[str]
+        """
+        ports = []
+        for _ in range(count):
+            modules = [self.new_module()] + [
+                self.new_module(type_code=0x2030) for _ in range(chain_length)
+            ]
+            ports.append(self.add_port(modules, **options).device)
+        return ports
+
+    def new_module(self, type_code: int = 0x0000, version: int = 0x4000) -> SimulatedModule:
+        """Returns a module with a fresh uuid of the given type code"""
+        return SimulatedModule(type_code << 32 | next(self.__uuids), version)
+
+    def unplug(self, simulated_port: SimulatedPort) -> None:
+        """Close a port like a pulled cable, its reader sees EIO
+
+        The device name is free to be reused by a port added later.
+        """
+        with self.__lock:
+            if simulated_port in self.simulated_ports:
+                self.simulated_ports.remove(simulated_port)
+                self.__selector.unregister(simulated_port)
+            simulated_port.close()
+
+    def ports(self) -> List[str]:
+        """Returns the device of every simulated port, usable as list_ports
+
+        :return: List[str]
+        """
+        return [simulated_port.device for simulated_port in self.simulated_ports]
+
+    def stats(self) -> dict:
+        return {
+            name: sum(getattr(simulated_port, name) for simulated_port in self.simulated_ports)
+            for name in ("reset_count", "complete_count", "drop_count",
+                         "corrupt_count", "overflow_count")
+        }
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        self.running = False
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+        with self.__lock:
+            for simulated_port in self.simulated_ports:
+                self.__selector.unregister(simulated_port)
+                simulated_port.close()
+            self.simulated_ports = []
+
+    def __push(self, when, callback, simulated_port):
+        heapq.heappush(self.__timers, (when, next(self.__timer_ids), callback, simulated_port))
+
+    def __run(self) -> None:
+        while self.running:
+            with self.__lock:
+                timeout = self.announce_interval
+                if self.__timers:
+                    timeout = max(0.0, min(timeout, self.__timers[0][0] - time.perf_counter()))
+            # Short cap so ports added from other threads are picked up
+            events = self.__selector.select(min(timeout, 0.05))
+            now = time.perf_counter()
+            with self.__lock:
+                for key, _ in events:
+                    simulated_port = key.fileobj
+                    for delay in simulated_port.receive():
+                        self.__push(now + delay, simulated_port.complete, simulated_port)
+                while self.__timers and self.__timers[0][0] <= now:
+                    _, _, callback, simulated_port = heapq.heappop(self.__timers)
+                    if not simulated_port.is_open:
+                        continue
+                    callback()
+                    if callback == simulated_port.announce:
+                        self.__push(now + self.announce_interval, callback, simulated_port)
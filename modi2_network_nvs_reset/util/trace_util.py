@@ -0,0 +1,133 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from modi2_network_nvs_reset.util.latency_util import percentile
+
+
+class Tracer:
+    """In-memory event trace of resets, exportable as Chrome trace json
+
+    Each event is one tuple appended to a bounded deque, a single
+    thread-safe call with no locking, so tracing can stay on while
+    resetting a fleet. Events belong to a track, the port of the reset,
+    and are either marks (phase reached) or spans with a duration (port
+    open, frame decode, dispatch, write). Times come from
+    time.perf_counter_ns.
+
+    Open the result of save() in chrome://tracing or https://ui.perfetto.dev
+    """
+
+    MARK = "i"
+    SPAN = "X"
+    START = "start"
+
+    def __init__(self, capacity: int = 1 << 18):
+        self.events = deque(maxlen=capacity)
+        self.start = time.perf_counter_ns()
+
+    now = staticmethod(time.perf_counter_ns)
+
+    def mark(self, track: str, name: str, args: Optional[dict] = None) -> None:
+        self.events.append((self.MARK, track, name, time.perf_counter_ns(), 0, args))
+
+    def span(self, track: str, name: str, start: int, end: Optional[int] = None,
+             args: Optional[dict] = None) -> None:
+        """Record a span which began at start, a value of Tracer.now()
+
+        :param end: End of the span, now if None
+        """
+        if end is None:
+            end = time.perf_counter_ns()
+        self.events.append((self.SPAN, track, name, start, end - start, args))
+
+    @contextmanager
+    def measure(self, track: str, name: str, args: Optional[dict] = None):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.span(track, name, start, args=args)
+
+    def clear(self) -> None:
+        self.events.clear()
+        self.start = time.perf_counter_ns()
+
+    def to_chrome_trace(self) -> dict:
+        """Returns the events in the Chrome trace event format
+
+        :return: dict
+        """
+        events = list(self.events)
+        track_ids: Dict[str, int] = dict()
+        trace_events = []
+        for kind, track, name, start, duration, args in events:
+            track_id = track_ids.setdefault(track, len(track_ids) + 1)
+            event = {
+                "name": name,
+                "ph": kind,
+                "ts": (start - self.start) / 1000,
+                "pid": 1,
+                "tid": track_id,
+            }
+            if kind == self.SPAN:
+                event["dur"] = duration / 1000
+            else:
+                event["s"] = "t"
+            if args:
+                event["args"] = args
+            trace_events.append(event)
+        trace_events.extend(
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": track_id,
+             "args": {"name": str(track)}}
+            for track, track_id in track_ids.items()
+        )
+        return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as trace_file:
+            json.dump(self.to_chrome_trace(), trace_file)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns count, total, mean, p50 and p99 in ms of every event name
+
+        Spans are summarised by their duration. Marks are summarised by
+        their offset from the last START mark of their track, the moment
+        the reset on that port began, or from the first event of the track.
+
+        :return: Dict[str, Dict[str, float]]
+        """
+        events = sorted(self.events, key=lambda event: event[3])
+        track_starts: Dict[str, int] = dict()
+        values: Dict[str, List[float]] = dict()
+        for kind, track, name, start, duration, _ in events:
+            if name == self.START or track not in track_starts:
+                track_starts[track] = start
+            value = duration if kind == self.SPAN else start - track_starts[track]
+            values.setdefault(name, []).append(value / 1e6)
+        return {
+            name: {
+                "count": len(samples),
+                "total_ms": sum(samples),
+                "mean_ms": sum(samples) / len(samples),
+                "p50_ms": percentile(samples, 0.5),
+                "p99_ms": percentile(samples, 0.99),
+            }
+            for name, samples in values.items()
+        }
+
+    def format_summary(self) -> str:
+        lines = [
+            f"{'event':24s} {'count':>8s} {'total ms':>10s} "
+            f"{'mean ms':>10s} {'p50 ms':>10s} {'p99 ms':>10s}"
+        ]
+        for name, row in sorted(
+            self.summary().items(), key=lambda item: -item[1]["total_ms"]
+        ):
+            lines.append(
+                f"{name:24s} {row['count']:>8d} {row['total_ms']:>10.3f} "
+                f"{row['mean_ms']:>10.3f} {row['p50_ms']:>10.3f} {row['p99_ms']:>10.3f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,165 @@
+"""Resets against modules simulated on pseudo terminals, Unix only"""
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from modi2_network_nvs_reset.core.network_reset import (
+    Network_reset_fleet_manager, Network_reset_manager, Network_reset_result,
+    Network_reset_session)
+from modi2_network_nvs_reset.core.network_reset_async import reset_all
+from modi2_network_nvs_reset.util import latency_util
+from modi2_network_nvs_reset.util.capture_util import (OUT, CaptureWriter,
+                                                     read_capture)
+from modi2_network_nvs_reset.util.latency_util import LatencyModel
+from modi2_network_nvs_reset.util.message_util import RESET_MESSAGE
+from modi2_network_nvs_reset.util.replay_util import ReplaySerial
+from modi2_network_nvs_reset.util.retry_util import RetryPolicy
+
+pytestmark = pytest.mark.skipif(
+    sys.platform.startswith("win"), reason="pseudo terminals are Unix only"
+)
+
+# Long enough that a reset is never answered within a test
+NEVER = 100
+
+
+@pytest.fixture(autouse=True)
+def latency_model(monkeypatch):
+    # A fresh model which is never saved, so tests neither read nor write
+    # the latencies learned on this machine
+    model = LatencyModel(path=None)
+    monkeypatch.setattr(latency_util, "_latency_model", model)
+    return model
+
+
+@pytest.fixture
+def simulator():
+    from modi2_network_nvs_reset.util.simulator_util import ModuleSimulator
+    with ModuleSimulator(seed=0) as simulator:
+        yield simulator
+
+
+def unplug_later(simulator, simulated_port, delay):
+    timer = threading.Timer(delay, simulator.unplug, args=(simulated_port,))
+    timer.start()
+    return timer
+
+
+def test_reset_completes(simulator):
+    port = simulator.add_port().device
+    with Network_reset_session(detect_timeout=2) as session:
+        result = session.reset(port)
+    assert result.outcome == Network_reset_result.COMPLETE
+    assert result.retries == 0
+
+
+def test_unplug_during_retries_leaves_other_ports_running(simulator):
+    good = simulator.add_port().device
+    unplugged = simulator.add_port(reset_delay=NEVER)
+    unplug_later(simulator, unplugged, 0.5)
+    results = Network_reset_fleet_manager(
+        ports=[good, unplugged.device], detect_timeout=2
+    ).start_reset_thread()
+    assert [result.outcome for result in results] == [
+        Network_reset_result.COMPLETE, Network_reset_result.DISCONNECTED
+    ]
+
+
+def test_session_survives_unplug_before_detection(simulator):
+    with Network_reset_session(detect_timeout=1) as session:
+        silent = simulator.add_port(modules=[])
+        unplug_later(simulator, silent, 0.2)
+        result = session.reset(silent.device)
+        assert result.outcome == Network_reset_result.DISCONNECTED
+        result = session.reset(simulator.add_port().device)
+        assert result.outcome == Network_reset_result.COMPLETE
+
+
+def test_threaded_reset_unplugged(simulator):
+    unplugged = simulator.add_port(reset_delay=NEVER)
+    manager = Network_reset_manager(port=unplugged.device)
+    unplug_later(simulator, unplugged, 0.5)
+    manager.start_reset_thread()
+    assert manager.wait(5)
+    manager.join(1)
+    assert manager.result.outcome == Network_reset_result.DISCONNECTED
+    assert manager.result.uuid != 0
+
+
+def test_async_reset_unplugged(simulator):
+    good = simulator.add_port().device
+    unplugged = simulator.add_port(reset_delay=NEVER)
+    unplug_later(simulator, unplugged, 0.5)
+    results = asyncio.run(asyncio.wait_for(
+        reset_all([good, unplugged.device], detect_timeout=2), 5
+    ))
+    assert [result.outcome for result in results] == [
+        Network_reset_result.COMPLETE, Network_reset_result.DISCONNECTED
+    ]
+
+
+def test_unanswered_reset_times_out(simulator):
+    port = simulator.add_port(reset_delay=NEVER).device
+    manager = Network_reset_manager(port=port)
+    manager.latency_model = None
+    manager.retry_policy = RetryPolicy(first_delay=0.05, deadline=0.5)
+    manager.start_reset_thread()
+    result = manager.wait_detected(2)
+    assert result.outcome == Network_reset_result.TIMEOUT
+    assert result.retries > 0
+
+
+def test_unanswered_reset_without_deadline_times_out(simulator):
+    port = simulator.add_port(reset_delay=NEVER).device
+    manager = Network_reset_manager(port=port)
+    manager.latency_model = None
+    manager.retry_policy = RetryPolicy(first_delay=0.05, deadline=None, max_retries=2)
+    manager.start_reset_thread()
+    assert manager.wait(5)
+    assert manager.result.outcome == Network_reset_result.TIMEOUT
+    assert manager.result.retries == 2
+
+
+def test_module_never_detected_times_out(simulator):
+    port = simulator.add_port(modules=[]).device
+    with Network_reset_session(detect_timeout=0.5) as session:
+        result = session.reset(port)
+    assert result.outcome == Network_reset_result.TIMEOUT
+    assert result.uuid == 0
+
+
+def test_corrupt_stream_resynchronises(simulator):
+    simulator.corrupt_rate = 0.3
+    ports = simulator.add_network_modules(8)
+    results = Network_reset_fleet_manager(ports=ports, detect_timeout=5).start_reset_thread()
+    assert all(result.is_complete for result in results)
+    assert simulator.stats()["corrupt_count"] > 0
+    assert any(result.frame_errors for result in results)
+
+
+def test_captured_reset_replays(simulator, tmp_path):
+    path = str(tmp_path / "reset.cap")
+    port = simulator.add_port().device
+    with CaptureWriter(path) as capture:
+        manager = Network_reset_manager(port=port)
+        manager.capture = capture
+        manager.start_reset_thread()
+        assert manager.wait(5)
+        manager.join(1)
+    assert manager.result.outcome == Network_reset_result.COMPLETE
+    reset_frame = RESET_MESSAGE.encode(manager.result.uuid & 0xFFF)
+    captured = b"".join(
+        record.data for record in read_capture(path) if record.direction == OUT
+    )
+    assert reset_frame in captured
+
+    ser = ReplaySerial.from_capture(path, port=port)
+    replayed = Network_reset_manager(port=ser.port, ser=ser)
+    replayed.start_reset_thread()
+    assert replayed.wait(5)
+    replayed.join(1)
+    assert replayed.result.outcome == Network_reset_result.COMPLETE
+    assert replayed.result.uuid == manager.result.uuid
+    assert reset_frame in ser.written